@@ -0,0 +1,49 @@
+"""Measure solver throughput on unique 9x9 puzzles.
+
+    python3 benchmarks/bench_solve.py [--count N] [--clues N] [--seed N]
+
+Puzzles are culled with cull_board(..., unique=True) down to ``--clues``,
+or to a minimal puzzle (~24 clues) with the default of 0, so every solve
+has to search the whole tree rather than stop at the first of many
+solutions.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sudoku"))
+
+from solve import count_solutions, solve  # noqa: E402
+from sudoku import cull_board, generate_board  # noqa: E402
+
+
+def puzzles(count, clues, seed, unit=3):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield cull_board(generate_board(unit, seed=rng), clues=clues, unique=True, seed=rng)
+
+
+def rate(function, boards):
+    start = time.perf_counter()
+    for board in boards:
+        function(board)
+    elapsed = time.perf_counter() - start
+    return len(boards) / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--clues", type=int, default=0, help="clues to keep; 0 for minimal puzzles")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    boards = list(puzzles(args.count, args.clues, args.seed))
+    print("solve:            {:8.0f} puzzles/s".format(rate(solve, boards)))
+    print("count_solutions:  {:8.0f} puzzles/s".format(rate(count_solutions, boards)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Load-test the sudoku web server.
+
+    python3 benchmarks/loadtest.py --url http://localhost:6543/ --clients 16
+    python3 benchmarks/loadtest.py --compare
+
+--compare starts sudoku/serve.py once single-threaded (the old wsgiref
+setup) and once with the pooled server, and loads each in turn.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+SERVE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sudoku", "serve.py")
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def load(url, clients, duration):
+    """Hit ``url`` from ``clients`` threads for ``duration`` seconds."""
+    latencies = []
+    errors = [0]
+    deadline = time.perf_counter() + duration
+
+    def client():
+        mine = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+            except OSError:
+                errors[0] += 1
+                continue
+            mine.append(time.perf_counter() - start)
+        latencies.extend(mine)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed,
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+    }
+
+
+def report(name, result):
+    print("{:<16} {requests:7d} req  {errors:4d} err  {rps:8.1f} req/s  p50 {p50_ms:7.1f} ms  p99 {p99_ms:7.1f} ms"
+          .format(name, **result))
+
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server at {} did not come up".format(url))
+
+
+def compare(port, clients, duration, path):
+    modes = [
+        ("single-threaded", ["--threads", "0"]),
+        ("pooled", ["--threads", str(clients)]),
+    ]
+    for name, flags in modes:
+        server = subprocess.Popen([sys.executable, SERVE, "--host", "127.0.0.1", "--port", str(port), "--quiet"]
+                                  + flags)
+        try:
+            url = "http://127.0.0.1:{}{}".format(port, path)
+            wait_for(url)
+            report(name, load(url, clients, duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:6543/")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--port", type=int, default=6580, help="port used by --compare")
+    parser.add_argument("--path", default="/", help="path loaded by --compare")
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(args.port, args.clients, args.duration, args.path)
+    else:
+        report(args.url, load(args.url, args.clients, args.duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Benchmark suite for Board operations, generation, culling and serving.
+
+    python3 benchmarks/run.py [--filter board.] [--output results.json]
+    python3 benchmarks/run.py --compare baseline.json [--threshold 0.1]
+
+Every benchmark is timed in ``--samples`` batches and ops/s comes from the
+median batch.  A second pass times each of its operations on its own for
+the p50/p90/p99 latencies, less the clock's own overhead, and a
+tracemalloc pass records the peak and net memory per operation.
+With --compare, any benchmark whose ops/s fell by more than the threshold
+is reported and the exit status is 1.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sudoku"))
+
+from sudoku import Board, cull_board, generate_board  # noqa: E402
+
+BENCHMARKS = {}
+
+
+def bench(name, number=1000):
+    """Register ``setup``, which returns the zero-argument operation to time."""
+    def register(setup):
+        BENCHMARKS[name] = (setup, number)
+        return setup
+    return register
+
+
+def _grid(unit=3, seed=0):
+    return generate_board(unit, seed=seed)
+
+
+def _puzzle(unit=3, seed=0):
+    return cull_board(_grid(unit, seed), 0.6, seed=seed)
+
+
+@bench("board.get", number=100000)
+def _():
+    board = _puzzle()
+    return lambda: board[(4, 4)]
+
+
+@bench("board.set_delete", number=50000)
+def _():
+    board = _puzzle()
+    key = next(key for key in [(r, c) for r in range(9) for c in range(9)] if key not in board)
+
+    def op():
+        board[key] = 5
+        del board[key]
+    return op
+
+
+@bench("board.copy", number=20000)
+def _():
+    board = _puzzle()
+    return lambda: Board(board)
+
+
+@bench("board.check", number=10000)
+def _():
+    board = _puzzle()
+    return board.check
+
+
+@bench("board.values", number=10000)
+def _():
+    board = _puzzle()
+    return lambda: list(board.values())
+
+
+@bench("board.to_csv", number=5000)
+def _():
+    board = _puzzle()
+    return board.to_csv
+
+
+for _unit, _number in ((2, 500), (3, 100), (4, 10), (5, 2)):
+    @bench("generate_board.unit{}".format(_unit), number=_number)
+    def _(unit=_unit):
+        rng = random.Random(0)
+        return lambda: generate_board(unit, seed=rng)
+
+
+@bench("generate_boards.100k", number=3)
+def _():
+    from sudoku import generate_boards
+    return lambda: generate_boards(100000, seed=0)
+
+
+@bench("cull_board.random", number=2000)
+def _():
+    grid = _grid()
+    rng = random.Random(0)
+    return lambda: cull_board(grid, 0.6, seed=rng)
+
+
+@bench("cull_board.unique", number=20)
+def _():
+    grid = _grid()
+    rng = random.Random(0)
+    return lambda: cull_board(grid, clues=0, unique=True, seed=rng)
+
+
+@bench("solve", number=200)
+def _():
+    from solve import solve
+    puzzles = [cull_board(_grid(seed=seed), clues=0, unique=True, seed=seed) for seed in range(20)]
+    cycle = iter(puzzles * 1000)
+    return lambda: solve(next(cycle))
+
+
+@bench("cache.result.hit", number=20000)
+def _():
+    from cache import ResultCache
+    results = ResultCache()
+    board = _puzzle()
+    results.result(board, solve=True)
+    return lambda: results.result(board, solve=True)
+
+
+@bench("serve.render_sudoku", number=1000)
+def _(cached=True):
+    from cache import ResultCache
+    from pyramid.config import Configurator
+    import serve
+    from wsgiref.util import setup_testing_defaults
+    with Configurator() as config:
+        serve.configure(config)
+        config.registry.result_cache = results = ResultCache()
+        app = config.make_wsgi_app()
+    query = "values=" + ",".join(str(value or "") for value in _puzzle().values())
+
+    def start_response(status, headers):
+        pass
+
+    def op():
+        if not cached:
+            serve.parse_values.cache_clear()
+            serve.render_page.cache_clear()
+            results.__init__()
+        environ = {"PATH_INFO": "/", "QUERY_STRING": query}
+        setup_testing_defaults(environ)
+        b"".join(app(environ, start_response))
+    return op
+
+
+bench("serve.render_sudoku.uncached", number=1000)(lambda: BENCHMARKS["serve.render_sudoku"][0](cached=False))
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _clock_overhead(runs=1000):
+    # Median nanoseconds between two back-to-back perf_counter_ns() calls
+    clock = time.perf_counter_ns
+    gaps = sorted(-(clock() - clock()) for _ in range(runs))
+    return gaps[runs // 2]
+
+
+def measure(name, samples):
+    setup, number = BENCHMARKS[name]
+    op = setup()
+    batch = max(1, number // samples)
+    op()
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        for _ in range(batch):
+            op()
+        times.append((time.perf_counter() - start) / batch)
+    times.sort()
+
+    clock = time.perf_counter_ns
+    overhead = _clock_overhead()
+    latencies = []
+    for _ in range(number):
+        start = clock()
+        op()
+        latencies.append(max(0, clock() - start - overhead) / 1000)
+    latencies.sort()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    for _ in range(batch):
+        op()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "ops_per_sec": 1 / percentile(times, 0.5),
+        "p50_us": percentile(latencies, 0.50),
+        "p90_us": percentile(latencies, 0.90),
+        "p99_us": percentile(latencies, 0.99),
+        "peak_kib": (peak - before) / 1024,
+        "net_bytes_per_op": (current - before) / batch,
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old and result["ops_per_sec"] < old["ops_per_sec"] * (1 - threshold):
+            regressions.append((name, old["ops_per_sec"], result["ops_per_sec"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="*", help="glob matched against benchmark names")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--output", "-o", default=None, help="write results as JSON")
+    parser.add_argument("--compare", default=None, help="baseline JSON from an earlier --output")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in BENCHMARKS:
+        if fnmatch.fnmatch(name, args.filter) or args.filter in name:
+            results[name] = result = measure(name, args.samples)
+            print("{:<30} {ops_per_sec:12.1f} ops/s  p50 {p50_us:10.1f} us  p99 {p99_us:10.1f} us  "
+                  "peak {peak_kib:8.1f} KiB".format(name, **result), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "time": time.time(),
+                "results": results,
+            }, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline), args.threshold)
+        for name, old, new in regressions:
+            print("REGRESSION {}: {:.1f} -> {:.1f} ops/s ({:+.0%})".format(name, old, new, new / old - 1))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Time and memory per operation as boards grow from 4x4 (unit 2) to 36x36 (unit 6).
+
+    python3 benchmarks/scaling.py [--units 2 3 4 5 6] [--limit 10] [--output scaling.json]
+
+Each operation runs up to ``--repeat`` times within ``--budget`` seconds
+and reports its median time and its tracemalloc peak.  A run that takes
+longer than ``--limit`` seconds is interrupted and reported as a timeout,
+which marks where that algorithm stops being usable.
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sudoku"))
+
+from sudoku import Board, cull_board, generate_board  # noqa: E402
+
+
+class Timeout(Exception):
+    pass
+
+
+def _alarm(signum, frame):
+    raise Timeout()
+
+
+def _render(board):
+    import serve
+    return serve.render_page.__wrapped__(",".join(str(value or "") for value in board.values()))
+
+
+def _validate(board):
+    import validate
+    return validate.validate([board])
+
+
+def _solve(board):
+    from solve import solve
+    return solve(board)
+
+
+# name: (setup(unit, rng) -> argument, operation(argument))
+OPERATIONS = {
+    "generate_board": (lambda unit, rng: unit, lambda unit: generate_board(unit, seed=random.Random(0))),
+    "cull_board.random": (lambda unit, rng: generate_board(unit, seed=rng),
+                          lambda grid: cull_board(grid, 0.6, seed=0)),
+    "cull_board.unique": (lambda unit, rng: generate_board(unit, seed=rng),
+                          lambda grid: cull_board(grid, clues=0, unique=True, seed=0)),
+    "solve": (lambda unit, rng: cull_board(generate_board(unit, seed=rng), 0.5, seed=rng), _solve),
+    "board.copy": (lambda unit, rng: cull_board(generate_board(unit, seed=rng), 0.6, seed=rng), Board),
+    "board.check": (lambda unit, rng: cull_board(generate_board(unit, seed=rng), 0.6, seed=rng),
+                    lambda board: board.check()),
+    "board.string_roundtrip": (lambda unit, rng: cull_board(generate_board(unit, seed=rng), 0.6, seed=rng),
+                               lambda board: Board.from_string(board.to_string())),
+    "validate": (lambda unit, rng: generate_board(unit, seed=rng), _validate),
+    "serve.render_page": (lambda unit, rng: cull_board(generate_board(unit, seed=rng), 0.6, seed=rng), _render),
+}
+
+
+def measure(operation, argument, repeat, budget, limit):
+    """Return ``(median seconds, peak bytes)``; raises Timeout past ``limit``.
+
+    The tracemalloc pass runs several times slower than the timed runs, so
+    it gets ``5 * limit`` and reports a peak of None if it runs out.
+    """
+    times = []
+    deadline = time.perf_counter() + budget
+    signal.signal(signal.SIGALRM, _alarm)
+    try:
+        while len(times) < repeat and (not times or time.perf_counter() < deadline):
+            signal.setitimer(signal.ITIMER_REAL, limit)
+            started = time.perf_counter()
+            operation(argument)
+            times.append(time.perf_counter() - started)
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        tracemalloc.start()
+        signal.setitimer(signal.ITIMER_REAL, 5 * limit)
+        try:
+            operation(argument)
+            peak = tracemalloc.get_traced_memory()[1]
+        except Timeout:
+            peak = None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def _time(seconds):
+    for scale, unit in ((1, "s"), (1e-3, "ms"), (1e-6, "us")):
+        if seconds >= scale:
+            return "{:.3g} {}".format(seconds / scale, unit)
+    return "{:.3g} us".format(seconds / 1e-6)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, nargs="+", default=[2, 3, 4, 5, 6])
+    parser.add_argument("--filter", default="", help="only operations whose name contains this")
+    parser.add_argument("--repeat", type=int, default=20, help="most runs per operation and unit")
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds of repeats per operation and unit")
+    parser.add_argument("--limit", type=float, default=10.0, help="seconds before one run counts as a timeout")
+    parser.add_argument("--output", "-o", default=None, help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, (setup, operation) in OPERATIONS.items():
+        if args.filter not in name:
+            continue
+        results[name] = {}
+        timed_out = False
+        for unit in args.units:
+            if timed_out:
+                # Larger boards won't be faster
+                result = {"timeout": True, "skipped": True}
+            else:
+                try:
+                    argument = setup(unit, random.Random(unit))
+                    seconds, peak = measure(operation, argument, args.repeat, args.budget, args.limit)
+                    result = {"seconds": seconds, "peak_bytes": peak}
+                except Timeout:
+                    timed_out = True
+                    result = {"timeout": True}
+            results[name][unit] = result
+            size = unit ** 2
+            if result.get("timeout"):
+                print("{:<24} {:>2}x{:<2}  {}".format(
+                    name, size, size, "skipped" if result.get("skipped") else "> {:g} s".format(args.limit)),
+                    flush=True)
+            else:
+                peak = result["peak_bytes"]
+                print("{:<24} {:>2}x{:<2}  {:>10}  peak {}".format(
+                    name, size, size, _time(result["seconds"]),
+                    "{:10.1f} KiB".format(peak / 1024) if peak is not None else "   timeout"), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"limit": args.limit, "results": results}, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Import-time budget for the interactive entry points.
+
+    python3 benchmarks/startup.py [--runs 5] [--budget curse=80]
+
+Each module is imported in a fresh ``python -X importtime`` interpreter;
+the fastest run's cumulative time is compared against its budget, and the
+slowest imports it pulled in are listed.  Importing a forbidden module
+(numpy for the curses board) or going over budget makes the exit status 1.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+SUDOKU_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sudoku")
+
+# module: (budget in milliseconds, modules it must not import)
+BUDGETS = {
+    "curse": (40, ("numpy",)),
+    "sudoku": (25, ("numpy",)),
+    "solve": (25, ("numpy",)),
+}
+
+
+def import_times(module):
+    """Return ``{imported module: (self us, cumulative us)}`` for one fresh import.
+
+    Bytecode is written, as an installed copy would have it, so that only
+    the first run pays for compiling.
+    """
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=SUDOKU_DIR, env=env, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True, check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module; the fastest counts")
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=MS",
+                        help="override or add a budget")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports to list per module")
+    args = parser.parse_args(argv)
+
+    budgets = dict(BUDGETS)
+    for item in args.budget:
+        module, _, milliseconds = item.partition("=")
+        budgets[module] = (float(milliseconds), budgets.get(module, (0, ()))[1])
+
+    failed = False
+    for module, (budget, forbidden) in budgets.items():
+        times = min((import_times(module) for _ in range(args.runs)), key=lambda run: run[module][1])
+        total = times[module][1] / 1000
+        loaded = sorted(name for name in forbidden if name in times)
+        over = total > budget
+        failed = failed or over or bool(loaded)
+        print("{:<10} {:8.1f} ms  budget {:6.1f} ms  {}".format(
+            module, total, budget, "OVER BUDGET" if over else "ok"))
+        for name, (own, _) in sorted(times.items(), key=lambda item: -item[1][0])[:args.top]:
+            print("    {:<40} {:8.1f} ms".format(name, own / 1000))
+        if loaded:
+            print("    imports forbidden module(s): {}".format(", ".join(loaded)))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Packed binary puzzle archives with memory-mapped random access.
+
+An archive is a 16 byte header followed by fixed-size records, one per
+board, in row-major cell order:
+
+    magic   4s  b"SDKA"
+    version B   1
+    unit    B
+    bits    B   bits per cell: 4 when the values fit in a nibble, else 8
+    -       B   reserved
+    count   Q   number of records (little endian)
+
+With 4 bit cells the first cell of each pair is the high nibble and a 9x9
+board takes 41 bytes.  Reading never loads the file: Archive maps it and
+decodes only the records asked for.
+
+    python3 sudoku/archive.py puzzles.txt puzzles.sdka
+"""
+import mmap
+import os
+import struct
+import sys
+import numpy
+from sudoku import Board
+
+
+MAGIC = b"SDKA"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBxQ")
+
+
+def cell_bits(unit):
+    return 4 if unit ** 2 < 16 else 8
+
+
+def record_size(unit):
+    return (unit ** 4 * cell_bits(unit) + 7) // 8
+
+
+def pack(boards, unit):
+    """Pack an (N, n, n) array of values into (N, record_size) bytes."""
+    cells = numpy.asarray(boards, dtype=numpy.uint8).reshape(-1, unit ** 4)
+    if cell_bits(unit) == 8:
+        return cells
+    if cells.shape[1] % 2:
+        cells = numpy.concatenate([cells, numpy.zeros((cells.shape[0], 1), numpy.uint8)], axis=1)
+    return (cells[:, 0::2] << 4) | cells[:, 1::2]
+
+
+def unpack(records, unit):
+    """Inverse of pack(): (N, record_size) bytes to an (N, n, n) array."""
+    records = numpy.asarray(records, dtype=numpy.uint8)
+    size = unit ** 2
+    if cell_bits(unit) == 8:
+        return records.reshape(-1, size, size)
+    cells = numpy.empty((records.shape[0], 2 * records.shape[1]), numpy.uint8)
+    cells[:, 0::2] = records >> 4
+    cells[:, 1::2] = records & 0x0F
+    return cells[:, :size * size].reshape(-1, size, size)
+
+
+class ArchiveWriter:
+    """Write boards to a new archive; the header count is fixed up on close."""
+    def __init__(self, path, unit):
+        self.unit = unit
+        self.count = 0
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, unit, cell_bits(unit), 0))
+
+    def write(self, board):
+        self.write_array([board.cells] if isinstance(board, Board) else [board])
+
+    def write_array(self, boards):
+        records = pack(boards, self.unit)
+        self.file.write(records.tobytes())
+        self.count += records.shape[0]
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.unit, cell_bits(self.unit), self.count))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Archive:
+    """Read-only, memory-mapped view of an archive.
+
+    ``archive[i]`` decodes one record into a Board, ``archive.array(start,
+    stop)`` decodes a slice into an (N, n, n) array and ``archive.records``
+    is the zero-copy (count, record_size) uint8 view of the packed data.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as fl:
+            header = fl.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError("{} is not a puzzle archive".format(path))
+            magic, version, self.unit, bits, count = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION or bits != cell_bits(self.unit):
+                raise ValueError("{} is not a version {} puzzle archive".format(path, VERSION))
+            self.record_size = record_size(self.unit)
+            available = (os.fstat(fl.fileno()).st_size - HEADER.size) // self.record_size
+            # A writer that never closed leaves count at 0; trust the file size
+            self.count = min(count, available) if count else available
+            self._map = mmap.mmap(fl.fileno(), 0, access=mmap.ACCESS_READ) if available else None
+        self.records = (
+            numpy.frombuffer(self._map, numpy.uint8, self.count * self.record_size, HEADER.size)
+            .reshape(self.count, self.record_size)
+            if self._map else numpy.zeros((0, self.record_size), numpy.uint8)
+        )
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("archive index out of range")
+        start = HEADER.size + index * self.record_size
+        record = self._map[start:start + self.record_size]
+        if cell_bits(self.unit) == 8:
+            values = record
+        else:
+            values = [nibble for byte in record for nibble in (byte >> 4, byte & 0x0F)]
+        return Board.from_values(self.unit, values[:self.unit ** 4])
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def array(self, start=0, stop=None):
+        return unpack(self.records[start:stop], self.unit)
+
+    def close(self):
+        self.records = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: archive.py PUZZLES.txt OUTPUT.sdka", file=sys.stderr)
+        return 2
+    writer = None
+    with open(argv[0]) as lines:
+        for line in lines:
+            if line.strip():
+                board = Board.from_string(line)
+                if writer is None:
+                    writer = ArchiveWriter(argv[1], board.unit)
+                writer.write(board)
+    if writer is not None:
+        writer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
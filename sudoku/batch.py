@@ -0,0 +1,172 @@
+"""Generate puzzles in bulk across a process pool.
+
+    python3 sudoku/batch.py --count 1000000 --unit 3 --clues 25 --workers 8
+
+Puzzles are written one per line as they complete, either as a row-major
+string (see Board.to_string) or as one comma separated row of values.
+"""
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import os
+import random
+import sys
+import time
+from grade import cull_to_band
+from sudoku import cull_board, generate_board
+
+
+FORMATS = {
+    "line": lambda board: board.to_string(),
+    "csv": lambda board: ",".join(str(value) if value else "" for value in board.cells),
+}
+
+
+def make_puzzles(count, unit=3, clues=None, unique=True, symmetry=None, seed=None, fmt="line", band=None,
+                 fingerprint=False):
+    """Return ``count`` formatted puzzles drawn from one seeded generator.
+
+    With ``band`` as ``(low, high)`` every puzzle is unique and grades in
+    that score range (see grade.cull_to_band); ``clues`` is then ignored.
+    With ``fingerprint`` each puzzle is a ``(canonical.fingerprint(), text)``
+    pair instead.
+    """
+    if fingerprint:
+        from canonical import fingerprint as key
+    rng = random.Random(seed)
+    puzzles = []
+    for _ in range(count):
+        board = generate_board(unit, seed=rng)
+        if band is not None:
+            puzzle = cull_to_band(board, *band, symmetry=symmetry, seed=rng)
+            while puzzle is None:
+                puzzle = cull_to_band(generate_board(unit, seed=rng), *band, symmetry=symmetry, seed=rng)
+        elif clues is None:
+            puzzle = cull_board(board, 0.6, unique=unique, symmetry=symmetry, seed=rng)
+        else:
+            puzzle = cull_board(board, clues=clues, unique=unique, symmetry=symmetry, seed=rng)
+        puzzles.append((key(puzzle), FORMATS[fmt](puzzle)) if fingerprint else FORMATS[fmt](puzzle))
+    return puzzles
+
+
+def _make_chunk(task):
+    return make_puzzles(**task)
+
+
+# A dedup run stops after this many chunks in a row without a new puzzle
+MAX_STALE_CHUNKS = 20
+
+
+def generate(count, unit=3, clues=None, unique=True, symmetry=None, seed=None, fmt="line",
+             workers=None, chunk_size=100, band=None, dedup=None):
+    """Yield ``count`` formatted puzzles in completion order.
+
+    Work is split into chunks of at most ``chunk_size`` puzzles, each with
+    its own seed drawn from ``seed`` and sized by how many puzzles are still
+    missing.  At most two chunks per worker are in flight, so memory stays
+    bounded however large ``count`` is.  With ``dedup`` (a
+    canonical.DedupIndex) puzzles equivalent to one already in the index
+    are dropped and replaced, and each puzzle yielded is added to it.
+    Raises ValueError when MAX_STALE_CHUNKS chunks in a row are all
+    duplicates, as when ``count`` is more than the unit has puzzles.
+    """
+    rng = random.Random(seed)
+    workers = workers or os.cpu_count() or 1
+    written = 0
+    stale = 0
+
+    def task(size):
+        return dict(count=size, unit=unit, clues=clues, unique=unique, symmetry=symmetry,
+                    seed=rng.getrandbits(64), fmt=fmt, band=band, fingerprint=dedup is not None)
+
+    def accepted(puzzles):
+        nonlocal written, stale
+        before = written
+        for puzzle in puzzles:
+            if dedup is not None:
+                key, puzzle = puzzle
+                if not dedup.add(key):
+                    continue
+            yield puzzle
+            written += 1
+        stale = 0 if written > before else stale + 1
+        if stale >= MAX_STALE_CHUNKS:
+            raise ValueError("no new puzzles in the last {} chunks after {} of {}".format(stale, written, count))
+
+    if workers == 1:
+        while written < count:
+            yield from accepted(_make_chunk(task(min(chunk_size, count - written))))
+        return
+
+    pending = {}  # future: chunk size
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            while written < count:
+                while len(pending) < 2 * workers:
+                    missing = count - written - sum(pending.values())
+                    if missing <= 0:
+                        break
+                    size = min(chunk_size, missing)
+                    pending[executor.submit(_make_chunk, task(size))] = size
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del pending[future]
+                    yield from accepted(future.result())
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--unit", type=int, default=3)
+    parser.add_argument("--clues", type=int, default=None,
+                        help="clues to keep (default: cull 60%% of the cells)")
+    parser.add_argument("--unique", action=argparse.BooleanOptionalAction, default=True,
+                        help="only emit puzzles with exactly one solution")
+    parser.add_argument("--symmetry", default=None,
+                        choices=["rotational", "mirror", "diagonal", "dihedral"])
+    parser.add_argument("--band", type=int, nargs=2, metavar=("LOW", "HIGH"), default=None,
+                        help="only emit puzzles whose grade.grade() score is in this range")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per core")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--format", dest="fmt", choices=sorted(FORMATS), default="line")
+    parser.add_argument("--output", "-o", default=None, help="default: stdout")
+    parser.add_argument("--dedup", default=None, metavar="INDEX",
+                        help="skip puzzles already in this canonical.DedupIndex file, and add new ones")
+    args = parser.parse_args(argv)
+
+    dedup = None
+    if args.dedup:
+        from canonical import MAX_UNIT, DedupIndex
+        if args.unit > MAX_UNIT:
+            parser.error("--dedup supports --unit up to {}".format(MAX_UNIT))
+        dedup = DedupIndex(args.dedup)
+    output = open(args.output, "w") if args.output else sys.stdout
+    start = last_report = time.perf_counter()
+    written = 0
+    try:
+        for puzzle in generate(args.count, args.unit, args.clues, args.unique, args.symmetry,
+                               args.seed, args.fmt, args.workers, args.chunk_size, args.band, dedup):
+            output.write(puzzle + "\n")
+            written += 1
+            now = time.perf_counter()
+            if now - last_report >= 1:
+                last_report = now
+                print("{} puzzles, {:.0f}/s".format(written, written / (now - start)),
+                      file=sys.stderr, flush=True)
+    except ValueError as error:
+        parser.exit(1, "{}: error: {}\n".format(parser.prog, error))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if dedup is not None:
+            dedup.close()
+    elapsed = time.perf_counter() - start
+    print("{} puzzles in {:.2f}s, {:.0f}/s".format(written, elapsed, written / elapsed if elapsed else 0),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Solutions, solution counts, conflicts and grades, cached by board contents.
+
+Entries are keyed by Board.digest() and kept in an in-process LRU bounded
+by an estimate of their size in bytes.  With a ``path`` they also go to a
+sqlite database, which outlives the process and is shared by every
+process pointing at it; an LRU miss that the database can answer counts
+as a disk hit and is promoted back into memory.
+
+A Result field is None until something asks for it: validating a board
+doesn't pay for solving it, and a 36x36 board can be checked even though
+it can't practically be solved.
+"""
+from collections import OrderedDict, namedtuple
+import functools
+import itertools
+import sqlite3
+import threading
+
+
+# ``count`` is 0, 1 or 2, where 2 means "more than one"; ``conflicts`` has
+# bit ``row * size + col`` set for each cell in conflict; ``grade`` is
+# grade.grade()'s score, and stays None for a board with conflicts.
+Result = namedtuple("Result", "solution count conflicts grade")
+
+CacheInfo = namedtuple("CacheInfo", "hits misses max_bytes currsize bytes")
+
+_ENTRY_BYTES = 200  # rough per-entry overhead of the key, tuple and dict slot
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    digest BLOB PRIMARY KEY,
+    solution TEXT,
+    count INTEGER,
+    conflicts BLOB NOT NULL,
+    grade INTEGER
+)
+"""
+
+_UPSERT = """
+INSERT INTO results (digest, solution, count, conflicts, grade) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (digest) DO UPDATE SET
+    solution = coalesce(excluded.solution, solution),
+    count = coalesce(excluded.count, count),
+    grade = coalesce(excluded.grade, grade)
+"""
+
+
+def _size(result):
+    return _ENTRY_BYTES + len(result.solution or "") + result.conflicts.bit_length() // 8
+
+
+class _BoundedCache:
+    # functools.lru_cache, but bounded by the bytes of its entries rather
+    # than their number, as a page for a 36x36 board is ~16 times one for 9x9.
+    def __init__(self, function, max_bytes, size):
+        functools.update_wrapper(self, function)
+        self.max_bytes = max_bytes
+        self._size = size
+        self._entries = OrderedDict()  # args: (result, bytes), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, *args):
+        with self._lock:
+            entry = self._entries.get(args)
+            if entry is not None:
+                self._entries.move_to_end(args)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        result = self.__wrapped__(*args)
+        size = _ENTRY_BYTES + self._size(args, result)
+        with self._lock:
+            old = self._entries.pop(args, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[args] = (result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return result
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.max_bytes, len(self._entries), self._bytes)
+
+    def cache_clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = 0
+
+
+def bounded_cache(max_bytes, size):
+    """Memoize a function of positional arguments in an LRU of at most ``max_bytes``.
+
+    ``size(args, result)`` estimates an entry's bytes.  Like lru_cache the
+    wrapper has cache_info(), cache_clear() and __wrapped__.
+    """
+    return lambda function: _BoundedCache(function, max_bytes, size)
+
+
+def analyze(board, solve=False, grade=False, known=None):
+    """Compute a Result for ``board``, reusing the fields already in ``known``."""
+    conflicts = known.conflicts if known else sum(1 << (row * board.cols + col) for row, col in board.conflicts)
+    solution = known.solution if known else None
+    count = known.count if known else None
+    score = known.grade if known else None
+    if conflicts:
+        solution, count = None, 0
+    elif solve and count is None:
+        from solve import iter_solutions
+        solutions = list(itertools.islice(iter_solutions(board), 2))
+        solution = solutions[0].to_string() if solutions else None
+        count = len(solutions)
+    if grade and score is None and not conflicts:
+        from grade import grade as grade_board
+        score = grade_board(board).score
+    return Result(solution, count, conflicts, score)
+
+
+class ResultCache:
+    def __init__(self, max_bytes=16 << 20, path=None):
+        self.max_bytes = max_bytes
+        self.path = path
+        self._entries = OrderedDict()  # digest: Result, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(_SCHEMA)
+
+    def get(self, digest):
+        """The cached Result for ``digest``, or None."""
+        with self._lock:
+            result = self._entries.get(digest)
+            if result is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return result
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT solution, count, conflicts, grade FROM results WHERE digest = ?", (digest,)
+                ).fetchone()
+                if row is not None:
+                    result = Result(row[0], row[1], int.from_bytes(row[2], "little"), row[3])
+                    self._remember(digest, result)
+                    self.disk_hits += 1
+                    return result
+            self.misses += 1
+            return None
+
+    def put(self, digest, result):
+        with self._lock:
+            self._remember(digest, result)
+            if self._db is not None:
+                conflicts = result.conflicts.to_bytes((result.conflicts.bit_length() + 7) // 8, "little")
+                self._db.execute(_UPSERT, (digest, result.solution, result.count, conflicts, result.grade))
+
+    def _remember(self, digest, result):
+        old = self._entries.pop(digest, None)
+        if old is not None:
+            self._bytes -= _size(old)
+        self._entries[digest] = result
+        self._bytes += _size(result)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= _size(evicted)
+            self.evictions += 1
+
+    def result(self, board, solve=False, grade=False):
+        """The Result for ``board``, with the solution and count and/or grade filled in if asked for."""
+        digest = board.digest()
+        known = self.get(digest)
+        if known is not None and not (solve and known.count is None) and not (
+                grade and known.grade is None and not known.conflicts):
+            return known
+        result = analyze(board, solve=solve, grade=grade, known=known)
+        self.put(digest, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
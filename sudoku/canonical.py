@@ -0,0 +1,204 @@
+"""Canonical forms of boards under the sudoku symmetries.
+
+Two boards are equivalent when one becomes the other by relabeling the
+digits, permuting rows within a band, permuting the bands, doing the same
+for columns and stacks, and/or transposing.  canonical() picks the
+lexicographically smallest equivalent (empty cells sort first), so
+equivalent boards have identical canonical forms and fingerprints.
+
+DedupIndex is an on-disk open-addressing hash set of fingerprints, memory
+mapped so that membership tests and inserts are O(1) without loading it.
+"""
+from array import array
+import functools
+import hashlib
+from itertools import permutations, product
+import mmap
+import os
+import struct
+import numpy
+from sudoku import Board
+
+
+# Largest unit canonical() handles; its search is exhaustive over column orders
+MAX_UNIT = 3
+
+
+@functools.lru_cache(maxsize=None)
+def _column_orders(unit):
+    # Every order of the columns that keeps stacks together: (P, n).
+    orders = []
+    for stacks in permutations(range(unit)):
+        for within in product(permutations(range(unit)), repeat=unit):
+            orders.append([stack * unit + within[slot][offset]
+                           for slot, stack in enumerate(stacks) for offset in range(unit)])
+    return numpy.array(orders, dtype=numpy.intp)
+
+
+def canonical(board):
+    """Return the canonical Board equivalent to ``board``.
+
+    Rows are chosen one slot at a time for every transposition and column
+    order at once, keeping only the candidates whose relabeled row is the
+    smallest so far.  Exhaustive over column orders, so only unit <= 3 is
+    supported.
+    """
+    unit, size = board.unit, board.rows
+    if unit > MAX_UNIT:
+        raise ValueError("canonical forms are only supported up to unit {}, not {}".format(MAX_UNIT, unit))
+    grid = numpy.frombuffer(bytes(board.cells), numpy.uint8).reshape(size, size).astype(numpy.intp)
+    grids = numpy.stack([grid, grid.T])
+    orders = _column_orders(unit)
+    count = 2 * len(orders)
+
+    transposed = numpy.repeat([0, 1], len(orders))
+    columns = numpy.tile(numpy.arange(len(orders)), 2)
+    chosen = numpy.zeros((count, 0), numpy.intp)
+    labels = numpy.full((count, size + 1), -1, numpy.intp)
+    labels[:, 0] = 0
+    next_label = numpy.ones(count, numpy.intp)
+    canonical_rows = []
+
+    for slot in range(size):
+        if slot % unit == 0:
+            used_bands = chosen // unit
+            options = numpy.arange(size)
+            valid = ~(used_bands[:, :, None] == (options // unit)[None, None, :]).any(axis=1)
+        else:
+            band = chosen[:, -1] // unit
+            options = numpy.arange(unit)
+            rows = band[:, None] * unit + options[None, :]
+            valid = ~(chosen[:, :, None] == rows[:, None, :]).any(axis=1)
+        parent, option = numpy.nonzero(valid)
+        row = options[option] if slot % unit == 0 else band[parent] * unit + option
+        transposed, columns = transposed[parent], columns[parent]
+        chosen = numpy.concatenate([chosen[parent], row[:, None]], axis=1)
+        labels, next_label = labels[parent], next_label[parent]
+
+        values = grids[transposed[:, None], row[:, None], orders[columns]]
+        relabeled = numpy.empty_like(values)
+        index = numpy.arange(len(values))
+        for cell in range(size):
+            digit = values[:, cell]
+            new = labels[index, digit] < 0
+            labels[index[new], digit[new]] = next_label[new]
+            next_label = next_label + new
+            relabeled[:, cell] = labels[index, digit]
+
+        keys = relabeled @ (size + 1) ** numpy.arange(size - 1, -1, -1, dtype=numpy.int64)
+        keep = keys == keys.min()
+        transposed, columns, chosen = transposed[keep], columns[keep], chosen[keep]
+        labels, next_label = labels[keep], next_label[keep]
+        canonical_rows.append(relabeled[keep][0])
+
+    return Board.from_values(unit, numpy.concatenate(canonical_rows).tolist())
+
+
+def fingerprint(board):
+    """A 64-bit hash of the canonical form; never 0."""
+    digest = hashlib.blake2b(canonical(board).to_string().encode("ascii"), digest_size=8).digest()
+    return struct.unpack("<Q", digest)[0] or 1
+
+
+class DedupIndex:
+    """A set of fingerprints in a memory-mapped open-addressing table.
+
+    The file is a 16 byte header (magic, slot count) followed by 64-bit
+    slots, with 0 marking an empty slot, and then one more 64-bit slot
+    holding the entry count.  The table doubles when it gets half full.
+    """
+    MAGIC = b"SDKD"
+    HEADER = struct.Struct("<4sxxxxQ")
+
+    def __init__(self, path, capacity=1 << 16):
+        self.path = path
+        if not os.path.exists(path):
+            self._create(path, max(16, 1 << (capacity - 1).bit_length()))
+        self._open()
+
+    @classmethod
+    def _create(cls, path, slots):
+        with open(path, "wb") as fl:
+            fl.write(cls.HEADER.pack(cls.MAGIC, slots))
+            fl.truncate(cls.HEADER.size + 8 * slots + 8)
+
+    def _open(self):
+        self._file = open(self.path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, self.slots = self.HEADER.unpack_from(self._map)
+        if magic != self.MAGIC:
+            raise ValueError("{} is not a dedup index".format(self.path))
+        view = memoryview(self._map)[self.HEADER.size:].cast("Q")
+        self._count_slot = view[self.slots:]
+        self._table = view[:self.slots]
+
+    def __len__(self):
+        return self._count_slot[0]
+
+    def _probe(self, key):
+        mask = self.slots - 1
+        position = key & mask
+        while True:
+            found = self._table[position]
+            if found == key or found == 0:
+                return position, found == key
+            position = (position + 1) & mask
+
+    def __contains__(self, item):
+        key = item if isinstance(item, int) else fingerprint(item)
+        return self._probe(key)[1]
+
+    def add(self, item):
+        """Add a Board or fingerprint; returns False if it was already there."""
+        key = item if isinstance(item, int) else fingerprint(item)
+        position, present = self._probe(key)
+        if present:
+            return False
+        self._table[position] = key
+        self._count_slot[0] += 1
+        if 2 * len(self) > self.slots:
+            self._grow()
+        return True
+
+    def _grow(self):
+        # Rehash into a temporary file and rename it over the index, so a
+        # crash leaves either the old table or the complete new one.
+        slots = 2 * self.slots
+        mask = slots - 1
+        table = array("Q", bytes(8 * (slots + 1)))
+        count = 0
+        for key in self._table:
+            if key:
+                position = key & mask
+                while table[position]:
+                    position = (position + 1) & mask
+                table[position] = key
+                count += 1
+        table[slots] = count
+        self.close()
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as fl:
+            fl.write(self.HEADER.pack(self.MAGIC, slots))
+            fl.write(table.tobytes())
+            fl.flush()
+            os.fsync(fl.fileno())
+        os.replace(temporary, self.path)
+        self._open()
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._table.release()
+            self._count_slot.release()
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
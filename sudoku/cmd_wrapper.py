@@ -1,23 +1,130 @@
+"""Play sudoku while commands run.
+
+    sudoku [--wait] COMMAND [ARGS...] [--- COMMAND [ARGS...]]...
+
+Commands run concurrently and without a shell.  Their output is read as
+it arrives, from one selector polled by the board's main loop, into a spill
+file plus a bounded in-memory tail, so a chatty build never piles up in
+RAM.  The message window shows a status line per job; once the board is
+closed and every job has finished, the output is written to stdout, one
+job after another.
+"""
 import curses
 import curse
-import threading
+import functools
+import os
+import selectors
+import shutil
 import subprocess as sp
 import sys
+import tempfile
 import time
 
 
-class Job(threading.Thread):
-    def __init__(self, job_command, board, complete_function, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.proc = None
-        self.job_command = job_command
-        self.board = board
-        self.complete_function = complete_function
+SEPARATOR = "---"
+
+
+def _size(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024 or unit == "GB":
+            return "{:.0f}{}".format(count, unit) if unit == "B" else "{:.1f}{}".format(count, unit)
+        count /= 1024
+
+
+class Job:
+    def __init__(self, argv, spill=True, tail_bytes=1 << 16):
+        """Start ``argv``; output beyond the last ``tail_bytes`` only goes to the spill file."""
+        self.argv = argv
+        self.name = os.path.basename(argv[0])
+        self.tail = bytearray()
+        self.tail_bytes = tail_bytes
+        self.spill = tempfile.TemporaryFile(prefix="sudoku-job-") if spill else None
+        self.received = 0
+        self.returncode = None
+        self.started = time.monotonic()
+        self.finished = None
+        self.proc = sp.Popen(argv, stdin=sp.DEVNULL, stdout=sp.PIPE, stderr=sp.STDOUT)
+        os.set_blocking(self.proc.stdout.fileno(), False)
+
+    def feed(self, data):
+        self.received += len(data)
+        if self.spill is not None:
+            self.spill.write(data)
+        self.tail += data
+        if len(self.tail) > self.tail_bytes:
+            del self.tail[:len(self.tail) - self.tail_bytes]
+
+    def finish(self):
+        self.proc.stdout.close()
+        self.returncode = self.proc.wait()
+        self.finished = time.monotonic()
+
+    def kill(self):
+        """Kill and reap the job, discarding its output."""
+        self.proc.kill()
+        self.finish()
+        if self.spill is not None:
+            self.spill.close()
+
+    def last_line(self):
+        lines = bytes(self.tail[-1024:]).replace(b"\r", b"\n").rstrip().rsplit(b"\n", 1)
+        return lines[-1].decode("utf-8", "replace").strip()
+
+    def status(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        state = "exit {}".format(self.returncode) if self.finished else "{:.0f}s".format(elapsed)
+        return "{} [{} {}]".format(self.name, state, _size(self.received))
+
+    def write_output(self, output):
+        """Write everything the job printed (or the tail, without a spill file) to binary ``output``."""
+        if self.spill is not None:
+            self.spill.seek(0)
+            shutil.copyfileobj(self.spill, output)
+            self.spill.close()
+            return
+        if self.received > len(self.tail):
+            output.write("[{} dropped]\n".format(_size(self.received - len(self.tail))).encode())
+        output.write(self.tail)
 
 
-    def run(self):
-        self.proc = sp.run(" ".join(self.job_command), stdout=sp.PIPE, stderr=sp.STDOUT, shell=True)
-        self.complete_function(self.board)
+class JobRunner:
+    """Reads every job's pipe through one selector without blocking."""
+    def __init__(self, jobs, budget=1 << 22):
+        """Each poll() reads at most ``budget`` bytes per job so the board stays responsive."""
+        self.jobs = jobs
+        self.budget = budget
+        self.selector = selectors.DefaultSelector()
+        for job in jobs:
+            self.selector.register(job.proc.stdout, selectors.EVENT_READ, job)
+
+    @property
+    def running(self):
+        return bool(self.selector.get_map())
+
+    def poll(self, timeout=0):
+        if not self.running:
+            return
+        for key, _ in self.selector.select(timeout):
+            job = key.data
+            read = 0
+            while read < self.budget:
+                try:
+                    data = os.read(key.fd, 1 << 16)
+                except BlockingIOError:
+                    break
+                if not data:
+                    self.selector.unregister(key.fileobj)
+                    job.finish()
+                    break
+                job.feed(data)
+                read += len(data)
+
+    def wait(self):
+        while self.running:
+            self.poll(None)
+
+    def status(self):
+        return " | ".join(job.status() for job in self.jobs)
 
 
 def board_quit(board):
@@ -29,25 +136,84 @@ def board_message(board, message):
     board.message(message)
 
 
-def main(screen, job_command, complete_function):
+def show_status(board, runner, complete_function, state):
+    # Polled from the board's main loop: read output, refresh the status line
+    # twice a second unless a move message is showing, and fire
+    # ``complete_function`` once every job is done.
+    runner.poll()
+    if state["done"]:
+        return
+    now = time.monotonic()
+    if runner.running and now - state["shown"] < 0.5:
+        return
+    state["shown"] = now
+    status = runner.status()
+    if len(runner.jobs) == 1 and runner.running:
+        status += " " + runner.jobs[0].last_line()
+    if board.message_time is None:
+        board.message(status, persist=True)
+    else:
+        board.default_message = status
+    if not runner.running:
+        state["done"] = True
+        complete_function(board)
+
+
+def main(screen, runner, complete_function):
     board = curse.CursesBoard(screen, autostart=False)
-    print(board)
-    job = Job(job_command, board, complete_function)
-    job.start()
+    board.pollers.append(functools.partial(show_status, board, runner, complete_function,
+                                           {"shown": 0.0, "done": False}))
     board.mainloop()
-    return job
+    return runner
+
+
+def start_jobs(commands):
+    """Start a Job per argv; if one can't be started, kill the ones that were and re-raise."""
+    jobs = []
+    try:
+        for argv in commands:
+            jobs.append(Job(argv))
+    except OSError:
+        for job in jobs:
+            job.kill()
+        raise
+    return jobs
+
+
+def parse_args(args):
+    """Split ``[--wait] CMD... [--- CMD...]`` into ``(wait, [argv, ...])``."""
+    wait = False
+    while args and args[0] == "--wait":
+        wait = True
+        args = args[1:]
+    commands = [[]]
+    for arg in args:
+        if arg == SEPARATOR:
+            commands.append([])
+        else:
+            commands[-1].append(arg)
+    return wait, [command for command in commands if command]
 
 
 if __name__ == "__main__":
-    args = sys.argv[1:]
+    wait, commands = parse_args(sys.argv[1:])
+    if not commands:
+        print(__doc__.strip().splitlines()[2].strip(), file=sys.stderr)
+        sys.exit(2)
     comp_func = board_quit
-    while True:
-        if args[0] == "--wait":
-            comp_func = lambda b: board_message(b, "Your Job Has Completed!")
-            args.pop(0)
-        else:
-            break
-    job = curses.wrapper(main, args, comp_func)
-    while job.is_alive():
-        time.sleep(1)
-    print(job.proc.stdout.decode(), end="")
+    if wait:
+        comp_func = lambda b: board_message(b, "Your Job Has Completed! " + runner.status())
+    try:
+        runner = JobRunner(start_jobs(commands))
+    except OSError as error:
+        print("sudoku: {}".format(error), file=sys.stderr)
+        sys.exit(127)
+    curses.wrapper(main, runner, comp_func)
+    runner.wait()
+    for job in runner.jobs:
+        if len(runner.jobs) > 1:
+            sys.stdout.buffer.write("==> {} <==\n".format(" ".join(job.argv)).encode())
+        sys.stdout.flush()
+        job.write_output(sys.stdout.buffer)
+    sys.stdout.flush()
+    sys.exit(next((job.returncode for job in runner.jobs if job.returncode), 0))
@@ -1,12 +1,18 @@
 import curses
 import getpass
-import inspect # For linenumber debugging
+from journal import Journal
 import math
 import os
-from sudoku import Board, InvalidValueError, cull_board, generate_board
+import stats
+from sudoku import Board, InvalidValueError, SYMBOLS, cull_board, generate_board
+import sys
 import time
 
 
+class UsageError(ValueError):
+    """Bad command line arguments, or a terminal too small for the board."""
+
+
 class CursesFrame:
     attributes = {
         "window",
@@ -34,30 +40,59 @@ class CursesFrame:
 
 
 class CursesBoard:
-    def __init__(self, screen, autostart=True, save_file=None):
+    def __init__(self, screen, autostart=True, save_file=None, unit=3):
+        """``unit`` is the block size of new boards, from 2 (4x4) to 6 (36x36)."""
+        if not 2 <= unit or unit ** 2 > len(SYMBOLS):
+            raise ValueError("unit must be in 2..{}, not {}".format(int(len(SYMBOLS) ** 0.5), unit))
         self.screen = screen
         screen.timeout(50)
         curses.init_pair(1, curses.COLOR_RED, curses.COLOR_BLACK)
         self.save_file = save_file if save_file else os.path.join(os.path.expanduser("~"), ".sudoku")
-        self.board = Board(3)
+        self.journal = Journal(self.save_file)
+        self.unit = unit
+        self.board = Board(unit)
         self.current_board = Board(self.board)
         self.default_message = "WELCOME {}!".format(getpass.getuser()).upper()
         self.message_time = None
+        self._drawn = {}
+        self._drawn_board = None
         self._row = 0
         self._col = 0
-        self.max_row = self.board.rows + self.board.rows // self.board.unit
-        self.max_col = 2 * (self.board.cols + self.board.cols // self.board.unit)
-        self.board_win = CursesFrame(self.screen.subwin(self.max_row+2, self.max_col+2, 0, 0))
-        self.message_win = CursesFrame(self.screen.subwin(1, curses.COLS-1, self.board_win.pary + self.board_win.maxy, 0))
-        self.help_win = CursesFrame(self.screen.subwin(1, curses.COLS-1, self.message_win.pary + self.message_win.maxy + 1, 0))
+        self.pollers = []  # called between keystrokes, at least every 50ms
+        self._layout_unit = None
+        self.layout()
         self.board_win.refresh()
         self.message(self.default_message)
         self.load()
+        self._fit()
         self.initialize()
         self._run = autostart
         if self._run:
             self.mainloop()
 
+    def layout(self):
+        """Size the board, message and help windows to fit the current board."""
+        unit = self.board.unit
+        self.max_row = self.board.rows + self.board.rows // unit
+        self.max_col = 2 * (self.board.cols + self.board.cols // unit)
+        if self.max_row + 4 > curses.LINES or self.max_col + 2 > curses.COLS:
+            raise UsageError("a {0}x{0} board needs a terminal of at least {1} columns and {2} lines".format(
+                self.board.rows, self.max_col + 2, self.max_row + 4))
+        self.screen.erase()
+        self.board_win = CursesFrame(self.screen.subwin(self.max_row+2, self.max_col+2, 0, 0))
+        self.message_win = CursesFrame(self.screen.subwin(1, curses.COLS-1, self.board_win.pary + self.board_win.maxy, 0))
+        self.help_win = CursesFrame(self.screen.subwin(1, curses.COLS-1, self.message_win.pary + self.message_win.maxy + 1, 0))
+        self._layout_unit = unit
+        self._drawn_board = None
+        self._row = self._col = 0
+
+    def _fit(self):
+        # Re-layout when a loaded or new board has a different unit
+        if self.board.unit != self._layout_unit:
+            self.layout()
+            return True
+        return False
+
     @property
     def row(self):
         return self._row
@@ -96,7 +131,7 @@ class CursesBoard:
     def initialize(self):
         for row in range(0, self.board_win.maxy):
             # HORIZONTAL BORDER
-            if row % 4 == 0:
+            if row % (self.board.unit + 1) == 0:
                 for col in range(self.board_win.maxx):
                     self.board_win.addch(row, col, curses.ACS_HLINE)
                 # TOP (UPPER CORNERs and BOTTOM TEEs)
@@ -121,25 +156,52 @@ class CursesBoard:
             else:
                 for col in range(0, self.board_win.maxx, 2 * self.board.unit + 2):
                     self.board_win.addch(row, col, curses.ACS_VLINE)
-        self.help_win.addnstr(0, 0, "^ up  v down  < left  > right  q quit", self.help_win.maxx)
+        self.help_win.addnstr(0, 0, "^ up  v down  < left  > right  u undo  r redo  n new  q quit", self.help_win.maxx)
         self.refresh()
 
-    def refresh(self):
-        failmask = self.current_board.check()
-        for row in range(self.current_board.rows):
-            for col in range(self.current_board.cols):
-                ch = str(self.current_board[(row, col)]) if (row, col) in self.current_board else " "
-                cursor = self.cursor(row, col)
-                options = 0
-
-                if failmask[(row, col)]:
-                    options |= curses.A_UNDERLINE | curses.color_pair(1)
-                if (row, col) in self.board:
-                    options |= curses.A_BOLD
-                self.board_win.addch(*cursor, ch, options)
+    def cell_view(self, row, col):
+        value = self.current_board[(row, col)]
+        options = 0
+        if (row, col) in self.current_board.conflicts:
+            options |= curses.A_UNDERLINE | curses.color_pair(1)
+        if (row, col) in self.board:
+            options |= curses.A_BOLD
+        return SYMBOLS[value - 1] if value else " ", options
+
+    def symbol_value(self, ch):
+        """The value typed as ``ch``, a digit or letter (see SYMBOLS), or None.
+
+        Lowercase letters that are commands (n, q, r, u) never get here, so
+        those values are typed in uppercase.
+        """
+        index = SYMBOLS.find(ch.upper()) if len(ch) == 1 else -1
+        return index + 1 if 0 <= index < self.current_board.rows else None
+
+    def refresh(self, cells=None):
+        """Redraw ``cells``, or every cell when None, batched into one update.
+
+        Cells whose conflict status changed are always included, and a cell
+        is only written if its character or attributes differ from what is
+        on screen.
+        """
+        started = stats.start()
+        if cells is None or self._drawn_board is not self.current_board:
+            self._drawn = {}
+            self._drawn_board = self.current_board
+            self.current_board.conflicts.changed()  # start tracking from here
+            cells = [(row, col) for row in range(self.current_board.rows) for col in range(self.current_board.cols)]
+        else:
+            cells = set(cells) | self.current_board.conflicts.changed()
+        for row, col in cells:
+            view = self.cell_view(row, col)
+            if self._drawn.get((row, col)) != view:
+                self._drawn[(row, col)] = view
+                self.board_win.addch(*self.cursor(row, col), *view)
         self.screen.move(*self.cursor())
-        self.help_win.refresh()
-        self.board_win.refresh()
+        self.help_win.noutrefresh()
+        self.board_win.noutrefresh()
+        curses.doupdate()
+        stats.stop("curses.refresh", started)
 
     def message(self, message, *, persist=False):
         if persist:
@@ -147,62 +209,80 @@ class CursesBoard:
             self.message_time = None
         else:
             self.message_time = time.time()
-        self.message_win.clear()
+        # erase() rather than clear(), which would repaint the whole terminal
+        self.message_win.erase()
         self.message_win.addnstr(0, 0, message, self.message_win.maxx)
-        self.message_win.refresh()
+        self.message_win.noutrefresh()
         self.screen.move(*self.cursor())
+        curses.doupdate()
 
     def clear_cell(self):
         if self.coordinate in self.current_board:
             self.message("CLEAR  {}".format(self.coordinate))
-            del self.current_board[self.coordinate]
-            self.refresh()
-            self.current_board.check()
+            self.journal.set(self.coordinate, None)
+            self.refresh([self.coordinate])
+
+    def undo(self):
+        key = self.journal.undo()
+        if key is None:
+            self.message("NOTHING TO UNDO")
+        else:
+            self.refresh([key])
+            self.message("UNDO   {}".format(key))
+
+    def redo(self):
+        key = self.journal.redo()
+        if key is None:
+            self.message("NOTHING TO REDO")
+        else:
+            self.refresh([key])
+            self.message("REDO   {}".format(key))
 
     def exit(self):
-        self.save()
+        # Every move is already in the journal
+        self.journal.close()
 
     def quit(self):
         self._run = False
 
     def load(self):
-        if not os.path.isfile(self.save_file):
+        if not self.journal.exists():
             self.new_board()
-        else:
+            return
+        try:
+            self.board, self.current_board = self.journal.load()
+        except ValueError as error:
             try:
-                with open(self.save_file) as save_file:
-                    lines = [[cell.strip() for cell in line.split(',')] for line in save_file.readlines()]
-                    # [print(line) for line in lines]
-                    # time.sleep(60)
-                    dimension = len(lines[0])
-                    self.board = Board(int(math.sqrt(dimension)))
-                    self.current_board = Board(int(math.sqrt(dimension)))
-                    for row in range(dimension):
-                        for col in range(dimension):
-                            # Get the root board item
-                            item = lines[row][col]
-                            if item != "":
-                                self.board[(row, col)] = int(item)
-                            # Get the current board item
-                            item = lines[row+dimension][col]
-                            if item != "":
-                                self.current_board[(row, col)] = int(item)
-            except IndexError:
+                self.board, self.current_board = self.journal.start(*self._load_csv())
+            except (IndexError, ValueError):
+                os.replace(self.save_file, self.save_file + ".bad")
                 self.new_board()
+                self.message("{}; moved it to {}.bad".format(error, self.save_file), persist=True)
+
+    def _load_csv(self):
+        # The save format before the journal: the puzzle then the current
+        # board, one comma separated row per line.
+        with open(self.save_file) as save_file:
+            lines = [[cell.strip() for cell in line.split(',')] for line in save_file.readlines()]
+        dimension = len(lines[0])
+        unit = int(math.sqrt(dimension))
+        if unit * unit != dimension or len(lines) < 2 * dimension:
+            raise ValueError("malformed save file")
+        board = Board.from_values(unit, [int(item) if item else 0 for line in lines[:dimension] for item in line])
+        current = Board.from_values(unit, [int(item) if item else 0 for line in lines[dimension:2 * dimension]
+                                           for item in line])
+        return board, current
 
     def save(self):
-        with open(self.save_file, "w") as save_file:
-            self.board.to_csv(save_file)
-            save_file.write("\n")
-            self.current_board.to_csv(save_file)
-            save_file.write("\n")
+        self.journal.compact()
 
     def new_board(self):
         self.message("Generating New Board...")
-        self.board = cull_board(generate_board(), 0.6)
-        self.current_board = Board(self.board)
-        self.save()
-        self.refresh()
+        self.board, self.current_board = self.journal.start(cull_board(generate_board(self.unit), 0.6))
+        if self._fit():
+            self.initialize()
+        else:
+            self.refresh()
         self.message("New Board Generated!")
 
     def mainloop(self):
@@ -211,6 +291,8 @@ class CursesBoard:
             if self.message_time and (time.time() - self.message_time) > 2:
                 self.message(self.default_message, persist=False)
                 self.message_time = None
+            for poll in self.pollers:
+                poll()
             try:
                 ch = self.screen.getkey()
             except curses.error:  # Handle delay getkey timeout without input
@@ -221,6 +303,10 @@ class CursesBoard:
                 self.quit()
             elif ch == 'n':  # New Board
                 self.new_board()
+            elif ch == 'u':
+                self.undo()
+            elif ch == 'r':
+                self.redo()
             elif ch == 'KEY_UP':
                 self.row -= 1
             elif ch == 'KEY_DOWN':
@@ -233,16 +319,15 @@ class CursesBoard:
                 if ch in {'KEY_DC', 'KEY_BACKSPACE', ' '}:
                     self.clear_cell()
                 else:
-                    try:
-                        i = int(ch)
-                        if self.current_board[self.coordinate] == i:
-                            self.clear_cell()
-                        else:
-                            self.current_board[self.coordinate] = i
-                            self.refresh()
-                            self.message("INSERT {}: {}".format(self.coordinate, i))
-                    except ValueError:
+                    i = self.symbol_value(ch)
+                    if i is None:
                         self.message("UNUSED KEY {}".format(bytes(ch, "utf-8")))
+                    elif self.current_board[self.coordinate] == i:
+                        self.clear_cell()
+                    else:
+                        self.journal.set(self.coordinate, i)
+                        self.refresh([self.coordinate])
+                        self.message("INSERT {}: {}".format(self.coordinate, SYMBOLS[i - 1]))
             elif self.coordinate in self.board:
                 self.message("Can't Alter Cell {}".format(self.coordinate))
             else:
@@ -250,5 +335,19 @@ class CursesBoard:
         self.exit()
 
 
+def parse_unit(args):
+    """``[--unit N]`` or ``[--unit=N]``, parsed by hand since argparse would double the startup time."""
+    if not args:
+        return 3
+    option = args[0].split("=", 1) + args[1:]
+    if option[0] != "--unit" or len(option) != 2 or not option[1].isdigit() or not (
+            2 <= int(option[1]) and int(option[1]) ** 2 <= len(SYMBOLS)):
+        raise UsageError("usage: sudoku [--unit N], where N is the block size of new boards (2 to 6)")
+    return int(option[1])
+
+
 if __name__ == '__main__':
-    curses.wrapper(CursesBoard)
+    try:
+        curses.wrapper(CursesBoard, unit=parse_unit(sys.argv[1:]))
+    except UsageError as error:
+        sys.exit("sudoku: {}".format(error))
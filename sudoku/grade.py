@@ -0,0 +1,263 @@
+"""Grade puzzles by the human solving techniques they need.
+
+The grader repeatedly applies the cheapest technique that makes progress,
+from singles up to X-wings, and records how often each one was needed.  A
+puzzle the ladder can't finish is marked as needing a guess.
+
+The score is set by the hardest technique needed, not by how many steps
+it took, so a puzzle with few clues that falls to singles still grades
+as easy.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import random
+from sudoku import Board, _bit_values, _orbits, _popcount, cull_board
+
+
+Grade = namedtuple("Grade", ["score", "techniques", "solved"])
+
+# (name, weight) from cheapest to most expensive.  The score is the weight
+# of the hardest technique used plus, as a tie-break within that tier, the
+# number of steps taken at that weight capped at TIE_BREAK.  Weights are
+# further apart than that, so a harder technique always outscores any
+# number of easier steps.
+TECHNIQUES = (
+    ("naked_single", 0),
+    ("hidden_single", 10),
+    ("pointing", 20),
+    ("claiming", 20),
+    ("naked_pair", 30),
+    ("hidden_pair", 40),
+    ("naked_triple", 50),
+    ("x_wing", 60),
+)
+GUESS = ("guess", 100)
+TIE_BREAK = 9
+
+
+class _State:
+    def __init__(self, board):
+        g = self.g = board.geometry
+        self.assigned = board.cells.tolist()
+        self.candidates = [
+            1 << value if value else board.candidates(g.row_of[index], g.col_of[index])
+            for index, value in enumerate(self.assigned)
+        ]
+        self.blocks = g.units[2 * g.size:]
+        self.lines = g.units[:2 * g.size]
+
+    def place(self, index, value):
+        bit = 1 << value
+        self.assigned[index] = value
+        self.candidates[index] = bit
+        for peer in self.g.peers[index]:
+            self.candidates[peer] &= ~bit
+
+    def eliminate(self, cells, mask):
+        # Remove ``mask`` from ``cells``; True if anything changed.
+        changed = False
+        candidates = self.candidates
+        for index in cells:
+            if candidates[index] & mask and not self.assigned[index]:
+                candidates[index] &= ~mask
+                changed = True
+        return changed
+
+    def open_cells(self, unit):
+        return [index for index in unit if not self.assigned[index]]
+
+    def naked_single(self):
+        for index, value in enumerate(self.assigned):
+            mask = self.candidates[index]
+            if not value and mask and not mask & (mask - 1):
+                self.place(index, mask.bit_length() - 1)
+                return True
+        return False
+
+    def hidden_single(self):
+        for unit in self.g.units:
+            for value in _bit_values(self.g.full):
+                bit = 1 << value
+                places = [index for index in self.open_cells(unit) if self.candidates[index] & bit]
+                if len(places) == 1:
+                    self.place(places[0], value)
+                    return True
+        return False
+
+    def pointing(self):
+        # A value confined to one line within a block can't appear elsewhere on that line.
+        g = self.g
+        for block in self.blocks:
+            for value in _bit_values(self.g.full):
+                bit = 1 << value
+                places = [index for index in self.open_cells(block) if self.candidates[index] & bit]
+                if len(places) < 2:
+                    continue
+                for line_of, offset in ((g.row_of, 0), (g.col_of, g.size)):
+                    lines = {line_of[index] for index in places}
+                    if len(lines) == 1:
+                        line = g.units[offset + lines.pop()]
+                        if self.eliminate([index for index in line if index not in block], bit):
+                            return True
+        return False
+
+    def claiming(self):
+        # A value confined to one block within a line can't appear elsewhere in that block.
+        g = self.g
+        for line in self.lines:
+            for value in _bit_values(self.g.full):
+                bit = 1 << value
+                places = [index for index in self.open_cells(line) if self.candidates[index] & bit]
+                if len(places) < 2:
+                    continue
+                blocks = {g.block_of[index] for index in places}
+                if len(blocks) == 1:
+                    block = g.units[2 * g.size + blocks.pop()]
+                    if self.eliminate([index for index in block if index not in line], bit):
+                        return True
+        return False
+
+    def naked_pair(self):
+        return self._naked_subset(2)
+
+    def naked_triple(self):
+        return self._naked_subset(3)
+
+    def _naked_subset(self, size):
+        # ``size`` cells of a unit whose candidates together hold ``size``
+        # values claim those values for the unit.
+        for unit in self.g.units:
+            cells = [index for index in self.open_cells(unit) if 2 <= _popcount(self.candidates[index]) <= size]
+            for group in _combinations(cells, size):
+                mask = 0
+                for index in group:
+                    mask |= self.candidates[index]
+                if _popcount(mask) == size:
+                    if self.eliminate([index for index in unit if index not in group], mask):
+                        return True
+        return False
+
+    def hidden_pair(self):
+        # Two values that fit only the same two cells of a unit rule out
+        # every other candidate in those cells.
+        for unit in self.g.units:
+            cells = self.open_cells(unit)
+            places = {}
+            for value in _bit_values(self.g.full):
+                where = tuple(index for index in cells if self.candidates[index] & (1 << value))
+                if len(where) == 2:
+                    places.setdefault(where, []).append(value)
+            for where, values in places.items():
+                if len(values) == 2:
+                    mask = (1 << values[0]) | (1 << values[1])
+                    if any(self.candidates[index] & ~mask for index in where):
+                        for index in where:
+                            self.candidates[index] &= mask
+                        return True
+        return False
+
+    def x_wing(self):
+        g = self.g
+        for lines, cross_of, cross_offset in ((g.units[:g.size], g.col_of, g.size),
+                                              (g.units[g.size:2 * g.size], g.row_of, 0)):
+            for value in _bit_values(g.full):
+                bit = 1 << value
+                pairs = {}
+                for line in lines:
+                    where = [index for index in self.open_cells(line) if self.candidates[index] & bit]
+                    if len(where) == 2:
+                        pairs.setdefault(tuple(cross_of[index] for index in where), []).append(set(where))
+                for crosses, found in pairs.items():
+                    if len(found) < 2:
+                        continue
+                    corners = found[0] | found[1]
+                    cells = [index for cross in crosses for index in g.units[cross_offset + cross]
+                             if index not in corners]
+                    if self.eliminate(cells, bit):
+                        return True
+        return False
+
+
+def _combinations(items, size):
+    if size == 0:
+        yield ()
+        return
+    for position in range(len(items) - size + 1):
+        for rest in _combinations(items[position + 1:], size - 1):
+            yield (items[position],) + rest
+
+
+def grade(board):
+    """Grade ``board``; returns ``Grade(score, techniques, solved)``.
+
+    ``techniques`` maps each technique used to the number of steps it
+    took.  ``solved`` is False when the ladder got stuck, in which case a
+    guess is counted and grading stops.
+    """
+    if board.conflicts:
+        raise ValueError("cannot grade a board with conflicts")
+    state = _State(board)
+    used = {}
+    while not all(state.assigned):
+        for name, weight in TECHNIQUES:
+            if getattr(state, name)():
+                used[name] = used.get(name, 0) + 1
+                break
+        else:
+            name, weight = GUESS
+            used[name] = 1
+            return Grade(weight + 1, used, False)
+    tier = max((weight for name, weight in TECHNIQUES if name in used), default=0)
+    steps = sum(used[name] for name, weight in TECHNIQUES if weight == tier and name in used)
+    return Grade(tier + min(steps, TIE_BREAK), used, True)
+
+
+def _grade_string(text):
+    return grade(Board.from_string(text))
+
+
+def grade_batch(boards, workers=None, chunksize=64):
+    """Grade many boards, across ``workers`` processes unless it is 1."""
+    if workers == 1:
+        return [grade(board) for board in boards]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_grade_string, [board.to_string() for board in boards], chunksize=chunksize))
+
+
+def cull_to_band(board, low, high, symmetry=None, seed=None):
+    """Cull a full grid to a unique puzzle whose score is in [low, high].
+
+    The grid is culled to a minimal unique puzzle once; putting any of the
+    removed clues back keeps it unique.  A restored clue only removes
+    candidates, so the hardest technique needed, and with it the score's
+    tier, doesn't rise as clues come back; only the within-tier tie-break
+    can wobble.  A binary search over how many to restore therefore finds
+    the hardest puzzle scoring at most ``high`` with O(log n) gradings,
+    give or take the tie-break.  Returns None when that scores below
+    ``low``, e.g. a band of hard techniques for a grid whose minimal puzzle
+    falls to singles.
+    """
+    rng = seed if isinstance(seed, random.Random) else random.Random(seed)
+    minimal = cull_board(board, clues=0, unique=True, symmetry=symmetry, seed=rng)
+    removed = Board(board.unit)
+    for key, value in board.items():
+        if key not in minimal:
+            removed[key] = value
+    orbits = _orbits(removed, symmetry, rng)
+
+    def puzzle(restored):
+        candidate = Board(minimal)
+        for orbit in orbits[:restored]:
+            for key in orbit:
+                candidate[key] = board[key]
+        return candidate
+
+    lo, hi = 0, len(orbits)
+    while lo < hi:
+        middle = (lo + hi) // 2
+        if grade(puzzle(middle)).score <= high:
+            hi = middle
+        else:
+            lo = middle + 1
+    result = puzzle(lo)
+    return result if low <= grade(result).score <= high else None
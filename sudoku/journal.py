@@ -0,0 +1,185 @@
+"""Crash-safe saved games: a binary snapshot plus an append-only move journal.
+
+``path`` holds a snapshot of the puzzle and the current board, and
+``path + ".journal"`` the moves made since, one fixed-size record each.
+Both start with the same random generation number; a journal whose
+generation doesn't match the snapshot is stale and ignored.  Snapshots are
+written to a temporary file, synced and renamed into place, so a crash
+leaves either the old game or the new one, never a mix.
+
+Replaying the journal also rebuilds the undo/redo history.  A running game
+keeps its whole history across compactions, but one reloaded from disk can
+only undo the moves since the last snapshot.
+"""
+import os
+import random
+import struct
+from sudoku import Board, SYMBOLS
+
+
+SNAPSHOT = struct.Struct("<4sBBxxQ")  # magic, version, unit, generation
+SNAPSHOT_MAGIC = b"SDKS"
+JOURNAL = struct.Struct("<4sxxxxQ")  # magic, generation
+JOURNAL_MAGIC = b"SDKJ"
+VERSION = 1
+RECORD = struct.Struct("<BHBB")  # kind, cell index, old value, new value
+MOVE, UNDO, REDO = 1, 2, 3
+
+
+def _write_atomic(path, data):
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as fl:
+        fl.write(data)
+        fl.flush()
+        os.fsync(fl.fileno())
+    os.replace(temporary, path)
+
+
+class Journal:
+    def __init__(self, path, compact_every=4096):
+        """``compact_every`` moves, the journal is folded into a new snapshot."""
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.compact_every = compact_every
+        self.board = None
+        self.current = None
+        self.history = []  # (index, old, new) moves; the first ``position`` are applied
+        self.position = 0
+        self._generation = None
+        self._records = 0
+        self._fd = None
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def load(self):
+        """Read the snapshot and replay the journal; returns ``(board, current)``.
+
+        Raises ValueError if the snapshot is malformed.  A truncated final
+        journal record, from a crash mid-write, is dropped.
+        """
+        with open(self.path, "rb") as fl:
+            data = fl.read()
+        if len(data) < SNAPSHOT.size:
+            raise ValueError("{} is too short to be a saved game".format(self.path))
+        magic, version, unit, generation = SNAPSHOT.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != VERSION:
+            raise ValueError("{} is not a saved game".format(self.path))
+        if not 2 <= unit or unit ** 2 > len(SYMBOLS):
+            raise ValueError("{} has a unit {} board, outside 2..{}".format(self.path, unit, int(len(SYMBOLS) ** 0.5)))
+        cells = unit ** 4
+        if len(data) != SNAPSHOT.size + 2 * cells:
+            raise ValueError("{} has {} bytes, expected {}".format(self.path, len(data), SNAPSHOT.size + 2 * cells))
+        givens = list(data[SNAPSHOT.size:SNAPSHOT.size + cells])
+        current = list(data[SNAPSHOT.size + cells:])
+
+        history, position, records = [], 0, 0
+        try:
+            with open(self.journal_path, "rb") as fl:
+                journal = fl.read()
+        except FileNotFoundError:
+            journal = b""
+        if len(journal) >= JOURNAL.size and JOURNAL.unpack_from(journal) == (JOURNAL_MAGIC, generation):
+            body = journal[JOURNAL.size:]
+            if len(body) % RECORD.size:
+                body = body[:len(body) - len(body) % RECORD.size]
+                os.truncate(self.journal_path, JOURNAL.size + len(body))
+            for kind, index, old, new in RECORD.iter_unpack(body):
+                if index >= cells or old > unit ** 2 or new > unit ** 2:
+                    raise ValueError("{} has a record for cell {}".format(self.journal_path, index))
+                # Every record carries the cell's value after it, so undos and
+                # redos of moves from before the snapshot still replay.
+                if kind == MOVE:
+                    del history[position:]
+                    history.append((index, old, new))
+                    position += 1
+                elif kind == UNDO and position:
+                    position -= 1
+                elif kind == REDO and position < len(history):
+                    position += 1
+                current[index] = new
+                records += 1
+
+        self.board = Board.from_values(unit, givens)
+        self.current = Board.from_values(unit, current)
+        self.history, self.position = history, position
+        self._generation = generation
+        self._records = records
+        self._open_journal(truncate=not records)
+        return self.board, self.current
+
+    def start(self, board, current=None):
+        """Begin a new game from ``board``, replacing any saved one."""
+        self.board = board
+        self.current = Board(board) if current is None else current
+        self.history, self.position = [], 0
+        self.compact()
+        return self.board, self.current
+
+    def compact(self):
+        """Write the current state as the new snapshot and empty the journal.
+
+        The in-memory undo/redo history is kept.
+        """
+        self.close()
+        self._generation = random.getrandbits(64)
+        _write_atomic(self.path, SNAPSHOT.pack(SNAPSHOT_MAGIC, VERSION, self.board.unit, self._generation)
+                      + bytes(self.board.cells) + bytes(self.current.cells))
+        self._open_journal(truncate=True)
+
+    def _open_journal(self, truncate):
+        if truncate:
+            _write_atomic(self.journal_path, JOURNAL.pack(JOURNAL_MAGIC, self._generation))
+            self._records = 0
+        self._fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND)
+
+    def _append(self, kind, index, old, new):
+        os.write(self._fd, RECORD.pack(kind, index, old, new))
+        self._records += 1
+        if self._records >= self.compact_every:
+            self.compact()
+
+    def set(self, key, value):
+        """Set ``current[key]`` (None to clear it) and journal the move."""
+        index = self.current._index(key)
+        old = self.current.cells[index]
+        if value is None:
+            del self.current[key]
+        else:
+            self.current[key] = value
+        del self.history[self.position:]
+        self.history.append((index, old, value or 0))
+        self.position += 1
+        self._append(MOVE, index, old, value or 0)
+
+    def undo(self):
+        """Revert the last move; returns its key, or None if there is none."""
+        if not self.position:
+            return None
+        self.position -= 1
+        index, old, new = self.history[self.position]
+        self._apply(index, old)
+        self._append(UNDO, index, new, old)
+        return divmod(index, self.current.cols)
+
+    def redo(self):
+        """Reapply the last undone move; returns its key, or None if there is none."""
+        if self.position == len(self.history):
+            return None
+        index, old, new = self.history[self.position]
+        self.position += 1
+        self._apply(index, new)
+        self._append(REDO, index, old, new)
+        return divmod(index, self.current.cols)
+
+    def _apply(self, index, value):
+        key = divmod(index, self.current.cols)
+        if value:
+            self.current[key] = value
+        elif key in self.current:
+            del self.current[key]
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
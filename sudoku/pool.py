@@ -0,0 +1,158 @@
+"""Pre-generated puzzles, topped up in the background.
+
+Each difficulty bucket keeps a queue of ready puzzles.  A refill thread
+wakes whenever a bucket drops below its low watermark and generates until
+it reaches the high watermark, so taking a puzzle is a deque pop.
+"""
+from collections import deque
+from concurrent.futures import CancelledError
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import threading
+import time
+from batch import make_puzzles
+from sudoku import Board
+
+
+log = logging.getLogger(__name__)
+
+
+# Score bands from grade.grade(): easy falls to naked singles, medium needs
+# hidden singles, and hard needs locked candidates, subsets or X-wings but
+# never a guess (which scores over 100).
+DEFAULT_BUCKETS = {
+    "easy": dict(band=(0, 9)),
+    "medium": dict(band=(10, 19)),
+    "hard": dict(band=(20, 99)),
+}
+
+
+class _ExecutorShutdown(Exception):
+    pass
+
+
+class PuzzlePool:
+    def __init__(self, unit=3, buckets=None, low=20, high=100, chunk_size=10, executor=None, dedup=None):
+        """``buckets`` maps a name to batch.make_puzzles() keyword arguments.
+
+        ``executor`` (e.g. a ProcessPoolExecutor) generates chunks off the
+        serving process; without it the refill thread generates them itself.
+        With ``dedup`` (a canonical.DedupIndex) refills skip puzzles that are
+        equivalent to one already handed out or queued.
+        """
+        self.unit = unit
+        self.buckets = dict(DEFAULT_BUCKETS if buckets is None else buckets)
+        self.low = low
+        self.high = high
+        self.chunk_size = chunk_size
+        self.executor = executor
+        self.dedup = dedup
+        self._dedup_lock = threading.Lock()
+        self.queues = {name: deque() for name in self.buckets}
+        self.generated = {name: 0 for name in self.buckets}
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+        self._refills = deque(maxlen=64)  # (finish time, puzzles, seconds)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="puzzle-pool", daemon=True)
+            self._thread.start()
+        self._wake.set()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def pop(self, bucket="medium"):
+        """Take a ready puzzle, generating one inline if the bucket is empty."""
+        queue = self.queues[bucket]
+        try:
+            puzzle = queue.popleft()
+            self.hits += 1
+        except IndexError:
+            fresh = []
+            while not fresh:
+                fresh = self._generate(bucket, 1)
+            puzzle = fresh[0]
+            self.misses += 1
+        if len(queue) < self.low:
+            self._wake.set()
+        return Board.from_string(puzzle)
+
+    def fill(self, bucket=None):
+        """Synchronously top up one bucket, or all of them, to the high watermark."""
+        for name in [bucket] if bucket else self.buckets:
+            while len(self.queues[name]) < self.high:
+                self._refill(name)
+
+    def stats(self):
+        refilled = sum(count for _, count, _ in self._refills)
+        seconds = sum(elapsed for _, _, elapsed in self._refills)
+        return {
+            "depth": {name: len(queue) for name, queue in self.queues.items()},
+            "generated": dict(self.generated),
+            "hits": self.hits,
+            "misses": self.misses,
+            "duplicates": self.duplicates,
+            "refill_rate": refilled / seconds if seconds else 0.0,
+            "low": self.low,
+            "high": self.high,
+        }
+
+    def _generate(self, bucket, count):
+        kwargs = dict(count=count, unit=self.unit, fingerprint=self.dedup is not None, **self.buckets[bucket])
+        puzzles = future = None
+        if self.executor is not None:
+            try:
+                future = self.executor.submit(make_puzzles, **kwargs)
+                puzzles = future.result()
+            except BrokenProcessPool:
+                # A worker died; keep serving by generating on this thread
+                log.exception("puzzle pool executor is broken; generating in-process from now on")
+                self.executor = None
+            except (RuntimeError, CancelledError):
+                # submit() refuses work, and shutdown() cancels it, once the
+                # executor is shut down by its owner or at interpreter exit
+                if future is None or future.cancelled():
+                    raise _ExecutorShutdown()
+                raise
+        if puzzles is None:
+            puzzles = make_puzzles(**kwargs)
+        if self.dedup is None:
+            return puzzles
+        with self._dedup_lock:
+            fresh = [text for key, text in puzzles if self.dedup.add(key)]
+        self.duplicates += len(puzzles) - len(fresh)
+        return fresh
+
+    def _refill(self, bucket):
+        start = time.perf_counter()
+        count = min(self.chunk_size, self.high - len(self.queues[bucket]))
+        puzzles = self._generate(bucket, count)
+        self.queues[bucket].extend(puzzles)
+        self.generated[bucket] += len(puzzles)
+        self._refills.append((time.time(), len(puzzles), time.perf_counter() - start))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            while not self._stop.is_set():
+                # Top up the emptiest bucket first so one busy bucket can't starve the rest
+                depth, name = min((len(queue), name) for name, queue in self.queues.items())
+                if depth >= self.high:
+                    break
+                try:
+                    self._refill(name)
+                except _ExecutorShutdown:
+                    return
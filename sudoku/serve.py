@@ -1,48 +1,130 @@
+import argparse
+from cache import ResultCache, analyze, bounded_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import functools
+import hashlib
+import json
+import os
 from pyramid.config import Configurator
-from pyramid.httpexceptions import HTTPFound
+from pyramid.httpexceptions import HTTPBadRequest, HTTPFound, HTTPNotModified
+from pyramid.settings import asbool
 from pyramid.view import view_config
-from sudoku import Board, cull_board, generate_board
-from wsgiref.simple_server import make_server
+from pool import PuzzlePool
+from sudoku import Board, _bit_values, cull_board, generate_board
+import signal
+import stats
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
 
 
-@view_config(route_name="render_sudoku")
-def render_sudoku(request):
-    unit = 3
+# Largest board served: 36x36, the most that SYMBOLS can write
+MAX_UNIT = 6
+
+
+@functools.lru_cache(maxsize=None)
+def grid_template(unit):
+    """A str.format template for a unit-sized board with one field per cell."""
+    cell = '<td width=25 height=25 style="text-align: center; padding: 0; border: 1px solid gray;">{}</td>'
+    row = '<tr style="padding: 0;">' + cell * unit ** 2 + "</tr>"
+    return '<table style="border-collapse: collapse; padding: 0;">' + row * unit ** 2 + "</table>"
+
 
-    page_html = '<table style="border-collapse: collapse; padding: 0;">'
+# Byte budgets for the parsed query and rendered page caches
+PARSE_CACHE_BYTES = 16 << 20
+RENDER_CACHE_BYTES = 32 << 20
 
+
+@bounded_cache(PARSE_CACHE_BYTES, lambda args, parsed: len(args[0]) + (8 * len(parsed[1]) if parsed else 0))
+def parse_values(values):
+    """Parse a comma separated ``values`` query to ``(unit, cells)``, or None."""
     try:
-        values = []
-        for x in request.GET["values"].split(","):
-            values.append(int(x) if x else None)
-    except (ValueError, KeyError):
-        return new_board(request)
+        cells = tuple(int(x) if x else 0 for x in values.split(","))
+    except ValueError:
+        return None
+    unit = round(len(cells) ** 0.25)
+    if not 2 <= unit <= MAX_UNIT or unit ** 4 != len(cells):
+        return None
+    if any(not 0 <= value <= unit ** 2 for value in cells):
+        return None
+    return unit, cells
 
-    if len(values) != unit ** 4:
-        return new_board(request)
 
-    board = Board(unit)
+@bounded_cache(RENDER_CACHE_BYTES, lambda args, page: len(args[0]) + (len(page[0]) if page else 0))
+def render_page(values):
+    """Render a comma separated ``values`` query to ``(body, etag)``.
 
-    for i, value in enumerate(values):
-        if value is not None:
-            board[(i // 9, i % 9)] = value
+    Returns None when the values don't describe a board.  Results are kept
+    in an LRU cache bounded by their size, so shared puzzle links are only
+    rendered once.
+    """
+    parsed = parse_values(values)
+    if parsed is None:
+        return None
+    unit, cells = parsed
+    body = grid_template(unit).format(*(value or "" for value in cells)).encode("utf-8")
+    return body, hashlib.sha1(body).hexdigest()
 
-    for row in range(board.rows):
-        page_html += '<tr style="padding: 0;">'
-        for col in range(board.cols):
-            page_html += '<td width=25 height=25 style="text-align: center; padding: 0; border: 1px solid gray;">{}</td>'.format(board[(row, col)] if (row, col) in board else '')
-        page_html += "</tr>"
 
-    page_html += "</table>"
+@view_config(route_name="render_sudoku")
+def render_sudoku(request):
+    page = render_page(request.GET.get("values", ""))
+    if page is None:
+        return new_board(request)
+    body, etag = page
 
-    response = request.response
-    response.body = bytes(page_html, request.url_encoding)
+    response = HTTPNotModified() if etag in request.if_none_match else request.response
     response.headers["Access-Control-Allow-Origin"] = "*"
+    response.etag = etag
+    if response.status_int != 304:
+        response.body = body
     return response
 
 
+@view_config(route_name="pool_stats", renderer="json")
+def pool_stats(request):
+    pool = getattr(request.registry, "puzzle_pool", None)
+    return pool.stats() if pool else {}
+
+
+@view_config(route_name="metrics", renderer="json")
+def metrics(request):
+    pool = getattr(request.registry, "puzzle_pool", None)
+    cache = render_page.cache_info()
+    results = getattr(request.registry, "result_cache", None)
+    return dict(
+        stats.snapshot(),
+        pool=pool.stats() if pool else None,
+        render_cache={"hits": cache.hits, "misses": cache.misses, "size": cache.currsize, "bytes": cache.bytes},
+        result_cache=results.stats() if results else None,
+    )
+
+
+def puzzle_options(request):
+    """Check the ``unit`` and ``difficulty`` query parameters; returns ``(unit, difficulty)``.
+
+    Raises HTTPBadRequest, so call it before any response is started.
+    """
+    pool = getattr(request.registry, "puzzle_pool", None)
+    try:
+        unit = int(request.GET.get("unit", pool.unit if pool else 3))
+    except ValueError:
+        raise HTTPBadRequest("unit must be an integer")
+    if not 2 <= unit <= MAX_UNIT:
+        raise HTTPBadRequest("unit must be in 2..{}".format(MAX_UNIT))
+    difficulty = request.GET.get("difficulty", "medium")
+    if pool is not None and difficulty not in pool.buckets:
+        raise HTTPBadRequest("difficulty must be one of {}".format(", ".join(sorted(pool.buckets))))
+    return unit, difficulty
+
+
+def take_puzzle(request, unit, difficulty):
+    pool = getattr(request.registry, "puzzle_pool", None)
+    if pool is None or unit != pool.unit:
+        return cull_board(generate_board(unit), 0.6)
+    return pool.pop(difficulty)
+
+
 def new_board(request):
-    board = cull_board(generate_board(), 0.6)
+    board = take_puzzle(request, *puzzle_options(request))
     values = [str(value) if value is not None else '' for value in board.values()]
     response = HTTPFound(
         request.route_url(
@@ -53,17 +135,268 @@ def new_board(request):
     return response
 
 
-def main(global_config, **settings):
-    """ This function returns a Pyramid WSGI application.
+MAX_BATCH = 1000
+
+
+def _parse_board(item):
+    # A board in a request body: a Board.to_string() row, or a flat or
+    # nested list of values with 0 or null for empty cells.
+    if isinstance(item, str):
+        return Board.from_string(item)
+    if isinstance(item, list):
+        if item and isinstance(item[0], list):
+            if not all(isinstance(row, list) for row in item):
+                raise ValueError("a nested board must be a list of rows")
+            values = [value for row in item for value in row]
+        else:
+            values = item
+        if not all(value is None or type(value) is int for value in values):
+            raise ValueError("board cells must be integers or null")
+        unit = round(len(values) ** 0.25)
+        if not 2 <= unit <= MAX_UNIT or unit ** 4 != len(values):
+            raise ValueError("{} cells is not a square board".format(len(values)))
+        return Board.from_values(unit, values)
+    raise ValueError("a board must be a string or a list, not {}".format(type(item).__name__))
+
+
+def _request_boards(request):
+    """Boards from a JSON array body, or from one board string per line."""
+    try:
+        if request.content_type == "application/json":
+            items = request.json_body
+            if not isinstance(items, list):
+                raise ValueError("expected a JSON array of boards")
+        else:
+            items = request.text.split()
+        if len(items) > MAX_BATCH:
+            raise ValueError("at most {} boards per request".format(MAX_BATCH))
+        return [_parse_board(item) for item in items]
+    except (TypeError, ValueError) as error:
+        raise HTTPBadRequest(str(error))
+
+
+def _stream(request, results, to_json, to_text):
+    # Stream ``results`` as a JSON array, or with ?format=text one line each
+    response = request.response
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    if request.GET.get("format") == "text":
+        response.content_type = "text/plain"
+        response.app_iter = ((to_text(result) + "\n").encode("utf-8") for result in results)
+    else:
+        response.content_type = "application/json"
+
+        def chunks():
+            yield b"["
+            for position, result in enumerate(results):
+                yield (("," if position else "") + json.dumps(to_json(result))).encode("utf-8")
+            yield b"]"
+        response.app_iter = chunks()
+    return response
+
+
+@view_config(route_name="api_puzzles", request_method="GET")
+def api_puzzles(request):
+    try:
+        count = int(request.GET.get("count", 1))
+    except ValueError:
+        raise HTTPBadRequest("count must be an integer")
+    if not 0 < count <= MAX_BATCH:
+        raise HTTPBadRequest("count must be in 1..{}".format(MAX_BATCH))
+    options = puzzle_options(request)
+    puzzles = (take_puzzle(request, *options).to_string() for _ in range(count))
+    return _stream(request, puzzles, lambda puzzle: puzzle, lambda puzzle: puzzle)
+
+
+def _analyze(request, board, solve=False):
+    cache = getattr(request.registry, "result_cache", None)
+    return cache.result(board, solve=solve) if cache else analyze(board, solve=solve)
+
+
+@view_config(route_name="api_validate", request_method="POST")
+def api_validate(request):
+    results = (
+        [divmod(index, board.cols) for index in _bit_values(_analyze(request, board).conflicts)]
+        for board in _request_boards(request)
+    )
+    return _stream(
+        request, results,
+        lambda keys: {"valid": not keys, "conflicts": [list(key) for key in keys]},
+        lambda keys: "0 " + " ".join("{},{}".format(*key) for key in keys) if keys else "1",
+    )
+
+
+@view_config(route_name="api_solve", request_method="POST")
+def api_solve(request):
+    boards = _request_boards(request)
+
+    def results():
+        for board in boards:
+            result = _analyze(request, board, solve=True)
+            yield result.solution, result.count == 1
+    return _stream(
+        request, results(),
+        lambda result: {"solution": result[0], "unique": result[1]},
+        lambda result: result[0] or "",
+    )
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGIServer that handles connections on a fixed-size thread pool."""
+    def __init__(self, *args, threads=8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def configure(config):
+    """Add the sudoku routes and views to a Pyramid ``config``."""
+    config.add_route('render_sudoku', '/')
+    config.add_route('pool_stats', '/pool')
+    config.add_route('metrics', '/metrics')
+    config.add_route('api_puzzles', '/api/puzzles')
+    config.add_route('api_validate', '/api/validate')
+    config.add_route('api_solve', '/api/solve')
+    config.scan(__name__)
+
+
+def _worker_signals():
+    # Leave Ctrl-C to the server, which shuts the workers down, and don't
+    # inherit its SIGTERM handler
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt()
+
+
+def make_app(settings):
+    if asbool(settings.get("sudoku.stats")):
+        stats.enable()
+    unit = int(settings.get("sudoku.pool.unit", 3))
+    dedup = None
+    if settings.get("sudoku.dedup"):
+        from canonical import MAX_UNIT, DedupIndex
+        if unit > MAX_UNIT:
+            raise ValueError("sudoku.dedup supports sudoku.pool.unit up to {}, not {}".format(MAX_UNIT, unit))
+        dedup = DedupIndex(settings["sudoku.dedup"])
+    # Band-targeted puzzles take up to a few hundred ms each; generate them
+    # in worker processes so refills and empty-bucket pops don't hold this
+    # process's GIL.  0 workers generates on the refill thread instead.
+    workers = int(settings.get("sudoku.pool.workers", 1))
+    executor = None
+    if workers:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_worker_signals)
+    pool = PuzzlePool(
+        unit=unit,
+        low=int(settings.get("sudoku.pool.low", 20)),
+        high=int(settings.get("sudoku.pool.high", 100)),
+        executor=executor,
+        dedup=dedup,
+    ).start()
+    with Configurator(settings=settings) as config:
+        configure(config)
+        config.registry.puzzle_pool = pool
+        config.registry.pool_executor = executor
+        config.registry.result_cache = ResultCache(
+            max_bytes=int(settings.get("sudoku.cache.bytes", 16 << 20)),
+            path=settings.get("sudoku.cache.path") or None,
+        )
+        return config.make_wsgi_app()
+
+
+def serve(settings):
+    """Run the app until interrupted.
+
+    ``sudoku.threads`` request threads per process (0 for the single-threaded
+    wsgiref server) and ``sudoku.processes`` forked processes sharing the
+    listening socket.  The app, and with it the puzzle pool's refill thread
+    and worker processes, is built after forking so that every process has
+    its own.  SIGTERM stops a process like Ctrl-C does: it shuts its pool
+    down, and the parent passes the signal on to its children and reaps
+    them.
     """
-    with Configurator() as config:
-        config.include('pyramid_jinja2')
-        config.add_route('render_sudoku', '/')
-        config.scan()
-        app = config.make_wsgi_app()
-    server = make_server('0.0.0.0', 6543, app)
-    server.serve_forever()
+    host = settings.get("sudoku.host", "0.0.0.0")
+    port = int(settings.get("sudoku.port", 6543))
+    threads = int(settings.get("sudoku.threads", 8))
+    processes = int(settings.get("sudoku.processes", 1))
+    if settings.get("sudoku.dedup") and processes > 1:
+        # DedupIndex has no locking, and a process that grows it renames a
+        # new file over the one the others still have mapped
+        raise ValueError("sudoku.dedup needs sudoku.processes 1, not {}".format(processes))
+    handler = QuietHandler if asbool(settings.get("sudoku.quiet")) else WSGIRequestHandler
+    if threads:
+        server = make_server(host, port, None, server_class=functools.partial(PooledWSGIServer, threads=threads),
+                             handler_class=handler)
+    else:
+        server = make_server(host, port, None, handler_class=handler)
+    signal.signal(signal.SIGTERM, _terminate)
+    children = []
+    for _ in range(processes - 1):
+        pid = os.fork()
+        if pid == 0:
+            children = None
+            break
+        children.append(pid)
+    app = make_app(settings)
+    server.set_app(app)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for pid in children or ():
+            os.kill(pid, signal.SIGTERM)
+        server.server_close()
+        app.registry.puzzle_pool.stop()
+        if app.registry.pool_executor is not None:
+            app.registry.pool_executor.shutdown(cancel_futures=True)
+        for pid in children or ():
+            os.waitpid(pid, 0)
+
+
+def main(global_config, **settings):
+    serve(settings)
 
 
 if __name__ == '__main__':
-    main(None)
+    parser = argparse.ArgumentParser(description="Serve sudoku boards over HTTP.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=6543)
+    parser.add_argument("--threads", type=int, default=8,
+                        help="request threads per process; 0 for the single-threaded server")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--pool-unit", dest="pool.unit", type=int, default=3,
+                        help="board unit the puzzle pool keeps ready; others are generated per request")
+    parser.add_argument("--pool-workers", dest="pool.workers", type=int, default=1,
+                        help="processes per server process generating pool puzzles; 0 for the refill thread")
+    parser.add_argument("--quiet", action="store_true", help="don't log each request")
+    parser.add_argument("--stats", action="store_true", help="collect counters and timers for /metrics")
+    parser.add_argument("--dedup", default=None, metavar="INDEX",
+                        help="canonical.DedupIndex file of puzzles already served; needs --processes 1")
+    parser.add_argument("--cache", dest="cache.path", default=None, metavar="PATH",
+                        help="sqlite file that keeps solve/validation results across restarts and processes")
+    parser.add_argument("--cache-bytes", dest="cache.bytes", type=int, default=16 << 20,
+                        help="in-process result cache size")
+    args = parser.parse_args()
+    main(None, **{"sudoku." + key: value for key, value in vars(args).items()})
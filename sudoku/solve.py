@@ -0,0 +1,109 @@
+from sudoku import Board, _bit_values, _most_constrained, _propagate
+
+
+def _initial_state(board):
+    # Candidate masks and assignments for ``board`` after propagating its
+    # clues, or None if the clues already contradict each other.  The
+    # board's unit masks already hold the effect of every clue on its peers,
+    # so only the singles they leave behind need propagating.
+    if board.conflicts:
+        return None
+    g = board.geometry
+    full = g.full
+    row_masks, col_masks, block_masks = board.row_masks, board.col_masks, board.block_masks
+    candidates = [
+        1 << value if value else
+        full & ~(row_masks[g.row_of[index]] | col_masks[g.col_of[index]] | block_masks[g.block_of[index]])
+        for index, value in enumerate(board.cells)
+    ]
+    assigned = board.cells.tolist()
+    queue = []
+    for index, mask in enumerate(candidates):
+        if not assigned[index] and not mask & (mask - 1):
+            if not mask:
+                return None
+            queue.append((index, mask.bit_length() - 1))
+    if not _propagate(g, candidates, assigned, queue, touched=(1 << len(g.units)) - 1):
+        return None
+    return candidates, assigned
+
+
+def _search(g, candidates, assigned):
+    # Depth-first search yielding every completion of a propagated state as a
+    # list of cell values.
+    stack = []
+    while True:
+        index = _most_constrained(candidates, assigned)
+        if index is None:
+            yield assigned
+        else:
+            stack.append((candidates, assigned, index, _bit_values(candidates[index])))
+        while True:
+            if not stack:
+                return
+            base_candidates, base_assigned, index, values = stack[-1]
+            if not values:
+                stack.pop()
+                continue
+            candidates, assigned = base_candidates[:], base_assigned[:]
+            if _propagate(g, candidates, assigned, [(index, values.pop())]):
+                break
+
+
+def iter_solutions(board):
+    """Yield every solution of ``board`` as a new Board."""
+    state = _initial_state(board)
+    if state is None:
+        return
+    for values in _search(board.geometry, *state):
+        yield Board.from_values(board.unit, values)
+
+
+def solve(board):
+    """Return a solution of ``board``, or None if it has none."""
+    return next(iter_solutions(board), None)
+
+
+def count_solutions(board, limit=2):
+    """Count the solutions of ``board``, stopping once ``limit`` are found.
+
+    The default answers the usual question of whether a puzzle is unique: 1
+    means exactly one solution, 2 means more than one.
+    """
+    state = _initial_state(board)
+    if state is None:
+        return 0
+    count = 0
+    for _ in _search(board.geometry, *state):
+        count += 1
+        if limit is not None and count >= limit:
+            break
+    return count
+
+
+def has_alternative(board, solution, indices):
+    """Whether ``board`` has a solution other than ``solution``.
+
+    Only the cells at ``indices`` are tried.  When ``board`` was made by
+    clearing those cells from a puzzle whose unique solution is
+    ``solution``, any other solution has to differ in one of them, so this
+    answers the uniqueness question with one propagation of ``board`` and
+    one targeted search per cleared cell instead of a full count.
+    """
+    state = _initial_state(board)
+    if state is None:
+        return False
+    g = board.geometry
+    candidates, assigned = state
+    for index in indices:
+        others = candidates[index] & ~(1 << solution.cells[index])
+        if assigned[index] or not others:
+            continue
+        trial_candidates, trial_assigned = candidates[:], assigned[:]
+        trial_candidates[index] = others
+        queue = [] if others & (others - 1) else [(index, others.bit_length() - 1)]
+        if not _propagate(g, trial_candidates, trial_assigned, queue):
+            continue
+        if next(_search(g, trial_candidates, trial_assigned), None) is not None:
+            return True
+    return False
@@ -0,0 +1,72 @@
+"""Opt-in counters and timers for the hot paths.
+
+Instrumentation is off unless enable() is called or SUDOKU_STATS is set in
+the environment.  Per-call counters, like Board.check's, check
+``stats.enabled`` first, so a disabled build pays one attribute lookup
+there.  Timed calls (generate_board, cull_board, CursesBoard.refresh) call
+start() and stop() unconditionally; disabled, that is two cheap function
+calls that return None, next to much more work.
+"""
+from collections import defaultdict
+import os
+import threading
+import time
+
+
+enabled = bool(os.environ.get("SUDOKU_STATS"))
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timers = defaultdict(lambda: [0, 0.0, 0.0])  # calls, total seconds, slowest
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def count(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def record(name, seconds):
+    with _lock:
+        timer = _timers[name]
+        timer[0] += 1
+        timer[1] += seconds
+        if seconds > timer[2]:
+            timer[2] = seconds
+
+
+def start():
+    """A start time for record(), or None when instrumentation is off."""
+    return time.perf_counter() if enabled else None
+
+
+def stop(name, started):
+    if started is not None:
+        record(name, time.perf_counter() - started)
+
+
+def snapshot():
+    with _lock:
+        return {
+            "enabled": enabled,
+            "counters": dict(_counters),
+            "timers": {
+                name: {
+                    "calls": calls,
+                    "total_ms": 1000 * total,
+                    "mean_ms": 1000 * total / calls if calls else 0.0,
+                    "max_ms": 1000 * slowest,
+                }
+                for name, (calls, total, slowest) in _timers.items()
+            },
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timers.clear()
@@ -1,7 +1,20 @@
+from array import array
 from collections import defaultdict
+import functools
 import io
-import numpy
-from typing import Union
+import operator
+import random
+import stats
+
+
+# One character per value, enough for 36x36 boards (unit 6)
+SYMBOLS = "123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ@"
+
+
+def cells_digest(unit, cells):
+    """A 16 byte digest of a board's unit and row-major cell values (0 for empty)."""
+    import hashlib  # here, as importing it costs more than the rest of this module
+    return hashlib.blake2b(bytes([unit]) + bytes(cells), digest_size=16).digest()
 
 
 class InvalidValueError(BaseException):
@@ -10,7 +23,57 @@ class InvalidValueError(BaseException):
         self.fails = fails
 
 
-class Board(dict):
+@functools.lru_cache(maxsize=None)
+def geometry(unit):
+    return Geometry(unit)
+
+
+class Geometry:
+    """Index tables shared by every board of one unit size.
+
+    Cells are numbered row-major; units are rows, then columns, then blocks.
+    """
+    def __init__(self, unit):
+        self.unit = unit
+        self.size = unit ** 2
+        self.cells = self.size ** 2
+        self.full = (1 << (self.size + 1)) - 2
+        self.row_of = [i // self.size for i in range(self.cells)]
+        self.col_of = [i % self.size for i in range(self.cells)]
+        self.block_of = [
+            (r // unit) * unit + (c // unit) for r, c in zip(self.row_of, self.col_of)
+        ]
+        self.units = [[] for _ in range(3 * self.size)]
+        for i in range(self.cells):
+            self.units[self.row_of[i]].append(i)
+            self.units[self.size + self.col_of[i]].append(i)
+            self.units[2 * self.size + self.block_of[i]].append(i)
+        self.cell_units = [
+            (self.row_of[i], self.size + self.col_of[i], 2 * self.size + self.block_of[i])
+            for i in range(self.cells)
+        ]
+        self.cell_unit_bits = [
+            sum(1 << unit_number for unit_number in self.cell_units[i])
+            for i in range(self.cells)
+        ]
+        self.peers = [
+            tuple(sorted({p for u in self.cell_units[i] for p in self.units[u]} - {i}))
+            for i in range(self.cells)
+        ]
+
+
+def _mask_array(size):
+    # One mask per unit with bit ``v`` set when value ``v`` is present.
+    return array("Q", bytes(8 * size)) if size < 64 else [0] * size
+
+
+class Board:
+    __slots__ = (
+        "unit", "rows", "cols", "geometry", "cells",
+        "row_masks", "col_masks", "block_masks", "_filled",
+        "_counts", "_dups", "_conflicting", "_changed",
+    )
+
     class Row:
         def __init__(self, board, row, start=0, stop=None):
             self.board = board
@@ -28,8 +91,10 @@ class Board(dict):
             del self.board[(self.row, col)]
 
         def __iter__(self):
+            cells = self.board.cells
+            base = self.row * self.board.cols
             for col in range(self.start, self.stop):
-                yield self[col]
+                yield cells[base + col] or None
 
     class Column:
         def __init__(self, board, col, start=0, stop=None):
@@ -48,47 +113,287 @@ class Board(dict):
             del self.board[(row, self.col)]
 
         def __iter__(self):
+            cells = self.board.cells
+            cols = self.board.cols
             for row in range(self.start, self.stop):
-                yield self[row]
+                yield cells[row * cols + self.col] or None
 
-    def __init__(self, arg: "Union[Board, int]"):
-        super().__init__()
+    def __init__(self, arg: "Board | int"):
+        self.unit = arg.unit if isinstance(arg, Board) else arg
+        self.geometry = geometry(self.unit)
+        self.rows = self.geometry.size
+        self.cols = self.rows
         if isinstance(arg, Board):
-            self.unit = arg.unit
-            for k, v in arg.items():
-                self[k] = v
+            self.cells = array(arg.cells.typecode, arg.cells)
+            self.row_masks = arg.row_masks[:]
+            self.col_masks = arg.col_masks[:]
+            self.block_masks = arg.block_masks[:]
+            self._filled = arg._filled
+            self._counts = None if arg._counts is None else arg._counts[:]
+            self._dups = None if arg._dups is None else arg._dups[:]
+            self._conflicting = arg._conflicting
         else:
-            self.unit = arg
-        self.rows = self.unit ** 2
-        self.cols = self.rows
-        self.numbers = {x+1 for x in range(self.unit ** 2)}
+            self.cells = array("B" if self.rows < 256 else "H", [0]) * self.geometry.cells
+            self.row_masks = _mask_array(self.rows)
+            self.col_masks = _mask_array(self.cols)
+            self.block_masks = _mask_array(self.rows)
+            self._filled = 0
+            # Conflict counts are only kept while some value repeats; see _count()
+            self._counts = None
+            self._dups = None
+            self._conflicting = 0
+        self._changed = None
+
+    @classmethod
+    def from_values(cls, unit, values):
+        """Build a board from row-major cell values, with 0 or None for empty."""
+        board = cls(unit)
+        cells = board.cells
+        for index, value in enumerate(values):
+            if value:
+                if not 1 <= value <= board.rows:
+                    raise ValueError(
+                        "{} values must be in 1..{}, not {}".format(cls.__name__, board.rows, value)
+                    )
+                cells[index] = value
+        board._rebuild()
+        return board
+
+    @classmethod
+    def from_array(cls, grid):
+        """Build a board from an (n, n) array, such as one from generate_boards()."""
+        size = len(grid)
+        unit = round(size ** 0.5)
+        if unit * unit != size or any(len(row) != size for row in grid):
+            raise ValueError("a {} row array is not a square board".format(size))
+        return cls.from_values(unit, [int(value) for row in grid for value in row])
+
+    def _rebuild(self):
+        # Recompute masks, and conflicts if any value repeats, from ``cells``.
+        g = self.geometry
+        cells = self.cells
+        repeated = False
+        for unit_number, unit in enumerate(g.units):
+            mask = 0
+            for index in unit:
+                value = cells[index]
+                if value:
+                    repeated = repeated or bool(mask >> value & 1)
+                    mask |= 1 << value
+            masks, offset = self._masks(unit_number)
+            masks[offset] = mask
+        self._filled = sum(1 for value in cells if value)
+        self._changed = None
+        if repeated:
+            self._count()
+        else:
+            self._counts = self._dups = None
+            self._conflicting = 0
+
+    def _count(self):
+        # Allocate and fill the conflict state from ``cells``:
+        # _counts[unit * (size + 1) + value] is how often value occurs in unit,
+        # _dups[index] the number of units in which the cell's value repeats.
+        # A conflict-free board has neither, which keeps the common case small.
+        g = self.geometry
+        cells = self.cells
+        stride = self.rows + 1
+        counts = self._counts = array(cells.typecode, [0]) * (3 * self.rows * stride)
+        for unit_number, unit in enumerate(g.units):
+            base = unit_number * stride
+            for index in unit:
+                value = cells[index]
+                if value:
+                    counts[base + value] += 1
+        dups = self._dups = array("B", [0]) * g.cells
+        conflicting = 0
+        for index, value in enumerate(cells):
+            repeats = 0
+            if value:
+                for unit_number in g.cell_units[index]:
+                    if counts[unit_number * stride + value] > 1:
+                        repeats += 1
+            dups[index] = repeats
+            conflicting += repeats > 0
+        self._conflicting = conflicting
+
+    @property
+    def numbers(self):
+        return set(range(1, self.rows + 1))
+
+    def _index(self, key):
+        if not (isinstance(key, tuple) and len(key) == 2):
+            raise ValueError(
+                "{} keys must be Tuple[int, int], not {}".format(
+                    type(self).__name__,
+                    type(key).__name__
+                )
+            )
+        row, col = key
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            raise KeyError(key)
+        return row * self.cols + col
 
     def __getitem__(self, item):
         if isinstance(item, int):
             return self.Row(self, item)
-        return super().__getitem__(item) if item in self else None
+        row, col = item
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return self.cells[row * self.cols + col] or None
+        return None
 
     def __setitem__(self, key, value):
-        if not (isinstance(key, tuple) and len(key) == 2):
+        index = self._index(key)
+        try:
+            value = operator.index(value)
+        except TypeError:
             raise ValueError(
-                "{} keys must be Tuple[int, int], not {}".format(
+                "{} values must be int, not {}".format(
                     type(self).__name__,
-                    type(key).__name__
+                    type(value).__name__
                 )
             )
-        if not isinstance(value, (int, numpy.int64)):
+        if not 1 <= value <= self.rows:
             raise ValueError(
-                "{} values must be int, not {}".format(
+                "{} values must be in 1..{}, not {}".format(
                     type(self).__name__,
-                    type(value).__name__
+                    self.rows,
+                    value
                 )
             )
-        super().__setitem__(key, value)
+        if self.cells[index]:
+            self._clear(index)
+        self._place(index, value)
+
+    def __delitem__(self, key):
+        index = self._index(key)
+        if not self.cells[index]:
+            raise KeyError(key)
+        self._clear(index)
+
+    def _masks(self, unit_number):
+        kind, offset = divmod(unit_number, self.rows)
+        return (self.row_masks, self.col_masks, self.block_masks)[kind], offset
+
+    def _place(self, index, value):
+        g = self.geometry
+        cells = self.cells
+        if self._counts is None:
+            bit = 1 << value
+            units = [self._masks(unit_number) for unit_number in g.cell_units[index]]
+            if not any(masks[offset] & bit for masks, offset in units):
+                cells[index] = value
+                self._filled += 1
+                for masks, offset in units:
+                    masks[offset] |= bit
+                return
+            self._count()
+        counts = self._counts
+        stride = self.rows + 1
+        cells[index] = value
+        self._filled += 1
+        for unit_number in g.cell_units[index]:
+            slot = unit_number * stride + value
+            count = counts[slot] + 1
+            counts[slot] = count
+            if count == 1:
+                masks, offset = self._masks(unit_number)
+                masks[offset] |= 1 << value
+                continue
+            if count == 2:
+                for other in g.units[unit_number]:
+                    if other != index and cells[other] == value:
+                        self._bump(other, 1)
+            self._bump(index, 1)
+
+    def _clear(self, index):
+        g = self.geometry
+        cells = self.cells
+        value = cells[index]
+        cells[index] = 0
+        self._filled -= 1
+        if self._counts is None:
+            for unit_number in g.cell_units[index]:
+                masks, offset = self._masks(unit_number)
+                masks[offset] &= ~(1 << value)
+            return
+        counts = self._counts
+        stride = self.rows + 1
+        for unit_number in g.cell_units[index]:
+            slot = unit_number * stride + value
+            count = counts[slot] - 1
+            counts[slot] = count
+            if count == 0:
+                masks, offset = self._masks(unit_number)
+                masks[offset] &= ~(1 << value)
+                continue
+            if count == 1:
+                for other in g.units[unit_number]:
+                    if cells[other] == value:
+                        self._bump(other, -1)
+            self._bump(index, -1)
+        if not self._conflicting:
+            self._counts = self._dups = None
+
+    def _bump(self, index, delta):
+        before = self._dups[index]
+        self._dups[index] = before + delta
+        if not before or before + delta == 0:
+            self._conflicting += delta
+            if self._changed is not None:
+                self._changed ^= {index}
+
+    @property
+    def conflicts(self):
+        return Conflicts(self)
+
+    def candidates(self, row, col):
+        """Bitmask of the values not yet used by the cell's row, column or block."""
+        return self.geometry.full & ~(
+            self.row_masks[row] |
+            self.col_masks[col] |
+            self.block_masks[self.block_number(row, col)]
+        )
+
+    def __contains__(self, key):
+        try:
+            row, col = key
+        except (TypeError, ValueError):
+            return False
+        return 0 <= row < self.rows and 0 <= col < self.cols and bool(self.cells[row * self.cols + col])
+
+    def __len__(self):
+        return self._filled
+
+    def __iter__(self):
+        return self.keys()
+
+    def __eq__(self, other):
+        if not isinstance(other, Board):
+            return NotImplemented
+        return self.unit == other.unit and self.cells == other.cells
+
+    __hash__ = None
+
+    def digest(self):
+        """A stable digest of the cells, equal for equal boards; see cells_digest()."""
+        return cells_digest(self.unit, self.cells)
+
+    def keys(self):
+        cols = self.cols
+        for index, value in enumerate(self.cells):
+            if value:
+                yield divmod(index, cols)
+
+    def items(self):
+        cols = self.cols
+        for index, value in enumerate(self.cells):
+            if value:
+                yield divmod(index, cols), value
 
     def values(self):
-        for row in range(self.rows):
-            for value in self.row(row):
-                yield value
+        for value in self.cells:
+            yield value or None
 
     def row(self, row):
         return self.Row(self, row)
@@ -97,47 +402,22 @@ class Board(dict):
         return self.Column(self, col)
 
     def block(self, block_number):
-        startrow = (block_number // self.unit) * self.unit
-        startcol = (block_number  % self.unit) * self.unit
-        for row in range(startrow, startrow+self.unit):
-            for col in range(startcol, startcol+self.unit):
-                yield self[row][col]
+        cells = self.cells
+        for index in self.geometry.units[2 * self.rows + block_number]:
+            yield cells[index] or None
 
     def block_number(self, row, col):
         return (row // self.unit) * self.unit + (col // self.unit)
 
     def check(self):
-        fails = defaultdict(lambda: False)
-        for row in range(self.rows):
-            for col in range(self.cols):
-                if (row, col) in self:
-                    check_value = self[(row, col)]
-                    values = set()
-                    for value in self.row(row):
-                        if value in values and value == check_value:
-                            fails[(row, col)] = True
-                        else:
-                            values.add(value)
-
-                    values = set()
-                    for value in self.col(col):
-                        if value in values and value == check_value:
-                            fails[(row, col)] = True
-                        else:
-                            values.add(value)
-
-                    values = set()
-                    for value in self.block(self.block_number(row, col)):
-                        if value in values and value == check_value:
-                            fails[(row, col)] = True
-                        else:
-                            values.add(value)
-
-        return fails
+        if stats.enabled:
+            stats.count("check.calls")
+        return defaultdict(lambda: False, {key: True for key in self.conflicts})
 
     def __repr__(self):
         lines = []
-        divider = ('+-' + '--' * self.unit) * self.unit + '+'
+        width = len(str(self.rows))
+        divider = ('+-' + '-' * (width + 1) * self.unit) * self.unit + '+'
         for row in range(self.rows):
             if row % self.unit == 0:
                 lines.append(divider)
@@ -146,12 +426,28 @@ class Board(dict):
                 if col % self.unit == 0:
                     line += '| '
                 value = self[row][col]
-                line += '{} '.format(value) if value else '  '
+                line += '{:>{}} '.format(value or '', width)
             line += '|'
             lines.append(line)
         lines.append(divider)
         return '\n'.join(lines)
 
+    def to_string(self):
+        """One symbol per cell in row-major order, with "." for empty cells."""
+        return "".join(SYMBOLS[value - 1] if value else "." for value in self.cells)
+
+    @classmethod
+    def from_string(cls, text):
+        """Parse to_string() output; "0" is also accepted for an empty cell."""
+        text = text.strip()
+        unit = round(len(text) ** 0.25)
+        if unit ** 4 != len(text):
+            raise ValueError("{} cells is not a square board".format(len(text)))
+        try:
+            return cls.from_values(unit, [0 if ch in ".0" else SYMBOLS.index(ch.upper()) + 1 for ch in text])
+        except ValueError:
+            raise ValueError("invalid board string {!r}".format(text))
+
     def to_csv(self, output=None):
         lines = []
         for row in range(self.rows):
@@ -166,30 +462,268 @@ class Board(dict):
             return csv_content
 
 
-def generate_board(unit=3, max_attempts=10000):
-    max_row = row = 0
-    for _ in range(1, 1 + max_attempts):
-        board = Board(unit)
-        try:
-            for row in range(board.rows):
-                for col in range(board.cols):
-                    available = list(
-                        board.numbers - (
-                                set(board.row(row)) |
-                                set(board.col(col)) |
-                                set(board.block(board.block_number(row, col)))
-                        )
-                    )
-                    board[row][col] = numpy.random.choice(available)
-            return board
-        except ValueError:
-            max_row = row if row > max_row else max_row
-    return None
-
-
-def cull_board(board, cull_value):
+class Conflicts:
+    """Live view of the cells whose value repeats in their row, column or block.
+
+    Indexing returns a bool, so it can stand in for the mask from check().
+    """
+    __slots__ = ("board",)
+
+    def __init__(self, board):
+        self.board = board
+
+    def __contains__(self, key):
+        board = self.board
+        return board._conflicting > 0 and key in board and bool(board._dups[key[0] * board.cols + key[1]])
+
+    def __getitem__(self, key):
+        return key in self
+
+    def __len__(self):
+        return self.board._conflicting
+
+    def __iter__(self):
+        if not self.board._conflicting:
+            return
+        cols = self.board.cols
+        for index, dups in enumerate(self.board._dups):
+            if dups:
+                yield divmod(index, cols)
+
+    def changed(self):
+        """Cells whose conflict status flipped since the previous call.
+
+        The first call starts tracking and returns every conflicting cell.
+        """
+        board = self.board
+        if board._changed is None:
+            board._changed = set()
+            return set(self)
+        cols = board.cols
+        changed = {divmod(index, cols) for index in board._changed}
+        board._changed.clear()
+        return changed
+
+
+def _bin_popcount(mask):
+    return bin(mask).count("1")
+
+
+_popcount = getattr(int, "bit_count", _bin_popcount)
+
+
+def _bit_values(mask):
+    values = []
+    while mask:
+        low = mask & -mask
+        values.append(low.bit_length() - 1)
+        mask ^= low
+    return values
+
+
+def _propagate(g, candidates, assigned, queue, touched=0):
+    # Apply the queued (index, value) assignments, eliminating each value from
+    # the cell's peers and following naked and hidden singles until nothing
+    # changes.  Only units that lost a candidate are rescanned for hidden
+    # singles; ``touched`` seeds that set.  Returns False as soon as a cell
+    # or unit runs out of options.
+    peers = g.peers
+    units = g.units
+    cell_unit_bits = g.cell_unit_bits
+    full = g.full
+    while True:
+        while queue:
+            index, value = queue.pop()
+            if assigned[index]:
+                if assigned[index] != value:
+                    return False
+                continue
+            bit = 1 << value
+            if not candidates[index] & bit:
+                return False
+            candidates[index] = bit
+            assigned[index] = value
+            for peer in peers[index]:
+                mask = candidates[peer]
+                if mask & bit:
+                    mask ^= bit
+                    if not mask:
+                        return False
+                    candidates[peer] = mask
+                    touched |= cell_unit_bits[peer]
+                    if not mask & (mask - 1):
+                        queue.append((peer, mask.bit_length() - 1))
+        while touched:
+            low = touched & -touched
+            touched ^= low
+            unit = units[low.bit_length() - 1]
+            once = twice = solved = 0
+            for index in unit:
+                mask = candidates[index]
+                if assigned[index]:
+                    solved |= mask
+                else:
+                    twice |= once & mask
+                    once |= mask
+            if once | solved != full:
+                return False
+            singles = once & ~twice & ~solved
+            if not singles:
+                continue
+            for index in unit:
+                if not assigned[index] and candidates[index] & singles:
+                    hidden = candidates[index] & singles
+                    if hidden & (hidden - 1):
+                        return False
+                    queue.append((index, hidden.bit_length() - 1))
+        if not queue:
+            return True
+
+
+def _most_constrained(candidates, assigned):
+    popcount = _popcount
+    best = None
+    best_count = 0
+    for index, value in enumerate(assigned):
+        if not value:
+            count = popcount(candidates[index])
+            if best is None or count < best_count:
+                best, best_count = index, count
+                if count == 2:
+                    break
+    return best
+
+
+def _fill(g, rng, budget):
+    # Randomized depth-first search over a grid with constraint
+    # propagation, branching on the cell with the fewest candidates (MRV).
+    # Gives up after ``budget`` dead ends so a restart can escape an unlucky
+    # prefix.  Returns the cell values, or None, and the dead ends hit.
+    candidates = [g.full] * g.cells
+    assigned = [0] * g.cells
+    # Blocks on the diagonal share no row or column, so each can be seeded
+    # with an independent random permutation before searching.
+    queue = []
+    for block in range(0, g.size, g.unit + 1):
+        values = list(range(1, g.size + 1))
+        rng.shuffle(values)
+        queue.extend(zip(g.units[2 * g.size + block], values))
+    if not _propagate(g, candidates, assigned, queue):
+        return None, 0
+    stack = []
+    dead_ends = 0
+    while True:
+        index = _most_constrained(candidates, assigned)
+        if index is None:
+            return assigned, dead_ends
+        values = _bit_values(candidates[index])
+        rng.shuffle(values)
+        stack.append((candidates, assigned, index, values))
+        while True:
+            if not stack:
+                return None, dead_ends
+            base_candidates, base_assigned, index, values = stack[-1]
+            if not values:
+                stack.pop()
+                continue
+            candidates, assigned = base_candidates[:], base_assigned[:]
+            if _propagate(g, candidates, assigned, [(index, values.pop())]):
+                break
+            dead_ends += 1
+            if dead_ends > budget:
+                return None, dead_ends
+
+
+def _shuffle(cells, g, rng):
+    # Apply a random validity-preserving symmetry: relabel the digits, permute
+    # rows within bands and the bands themselves (likewise for columns), and
+    # transpose half of the time.
+    unit, size = g.unit, g.size
+
+    def lines():
+        bands = rng.sample(range(unit), unit)
+        return [band * unit + line for band in bands for line in rng.sample(range(unit), unit)]
+
+    rows, cols = lines(), lines()
+    labels = [0] + rng.sample(range(1, size + 1), size)
+    shuffled = [labels[cells[r * size + c]] for r in rows for c in cols]
+    if rng.random() < 0.5:
+        shuffled = [shuffled[c * size + r] for r in range(size) for c in range(size)]
+    return shuffled
+
+
+def generate_board(unit=3, max_attempts=10000, seed=None):
+    """Generate a random full grid.
+
+    ``seed`` may be anything ``random.Random`` accepts, or a ``random.Random``
+    instance to draw from.  Returns None if ``max_attempts`` restarts fail.
+    """
+    started = stats.start()
+    rng = seed if isinstance(seed, random.Random) else random.Random(seed)
+    g = geometry(unit)
+    board = None
+    for attempt in range(1, max_attempts + 1):
+        cells, dead_ends = _fill(g, rng, budget=g.cells)
+        if stats.enabled:
+            stats.count("generate_board.attempts")
+            stats.count("generate_board.dead_ends", dead_ends)
+        if cells is not None:
+            board = Board.from_values(unit, _shuffle(cells, g, rng))
+            break
+    if started is not None:
+        stats.stop("generate_board", started)
+        stats.count("generate_board.failures" if board is None else "generate_board.boards")
+    return board
+
+
+_SYMMETRIES = {
+    None: lambda row, col, last: (),
+    "rotational": lambda row, col, last: ((last - row, last - col),),
+    "mirror": lambda row, col, last: ((row, last - col),),
+    "diagonal": lambda row, col, last: ((col, row),),
+    "dihedral": lambda row, col, last: (
+        (last - row, last - col), (row, last - col), (last - row, col),
+        (col, row), (last - col, last - row), (col, last - row), (last - col, row),
+    ),
+}
+
+
+def _orbits(board, symmetry, rng):
+    # Filled cells grouped by ``symmetry`` and shuffled, so clearing one group
+    # at a time keeps the remaining clues symmetric.
+    if symmetry not in _SYMMETRIES:
+        raise ValueError(
+            "symmetry must be one of {}, not {!r}".format(sorted(filter(None, _SYMMETRIES)), symmetry)
+        )
+    images = _SYMMETRIES[symmetry]
+    last = board.rows - 1
+    seen = set()
+    orbits = []
+    for key in board.keys():
+        if key not in seen:
+            orbit = {key, *images(key[0], key[1], last)}
+            seen.update(orbit)
+            orbits.append([k for k in orbit if k in board])
+    rng.shuffle(orbits)
+    return orbits
+
+
+def cull_board(board, cull_value=None, *, clues=None, unique=False, symmetry=None, seed=None):
+    """Return a copy of ``board`` with clues removed.
+
+    ``cull_value`` is the number of clues to remove, or the fraction of all
+    cells when it is a float.  ``clues`` instead gives the number of clues
+    to keep.  With ``unique`` a removal is only kept if the puzzle still has
+    exactly one solution, so fewer clues than asked may be removed.
+    ``symmetry`` ("rotational", "mirror", "diagonal" or "dihedral") removes
+    clues in symmetric groups.  ``seed`` is used as in generate_board().
+    """
+    started = stats.start()
     board_copy = Board(board)
-    if isinstance(cull_value, float):
+    rng = seed if isinstance(seed, random.Random) else random.Random(seed)
+    if clues is not None:
+        number_to_delete = len(board_copy) - clues
+    elif isinstance(cull_value, float):
         number_to_delete = int(cull_value * (board_copy.unit ** 4))
     elif isinstance(cull_value, int):
         number_to_delete = cull_value
@@ -197,15 +731,93 @@ def cull_board(board, cull_value):
         raise ValueError(
             "cull_value must be of type int or float, not {}".format(type(cull_value).__name__)
         )
-    if number_to_delete > len(board_copy):
-        number_to_delete = len(board_copy)
-    for _ in range(number_to_delete):
-        keys = list(board_copy.keys())
-        key = keys[numpy.random.choice(len(keys))]
-        del board_copy[key]
+    target = len(board_copy) - min(max(number_to_delete, 0), len(board_copy))
+
+    solution = None
+    if unique:
+        from solve import count_solutions, has_alternative, solve
+        if count_solutions(board_copy) != 1:
+            raise ValueError("a unique cull needs a board with exactly one solution")
+        solution = solve(board_copy)
+
+    for orbit in _orbits(board_copy, symmetry, rng):
+        if len(board_copy) <= target:
+            break
+        if len(board_copy) - len(orbit) < target:
+            continue
+        removed = [(key, board_copy[key]) for key in orbit]
+        for key in orbit:
+            del board_copy[key]
+        if not unique or all(_popcount(board_copy.candidates(*key)) == 1 for key in orbit):
+            # A cleared cell whose row, column and block still rule out every
+            # other value cannot open up another solution; skip the solver.
+            continue
+        if stats.enabled:
+            stats.count("cull_board.solver_checks")
+        if has_alternative(board_copy, solution, [r * board_copy.cols + c for r, c in orbit]):
+            if stats.enabled:
+                stats.count("cull_board.rejected")
+            for key, value in removed:
+                board_copy[key] = value
+    if started is not None:
+        stats.stop("cull_board", started)
+        stats.count("cull_board.removed", len(board) - len(board_copy))
     return board_copy
 
 
+def _random_lines(numpy, rng, count, unit):
+    # ``count`` random orders of rows (or columns) that keep bands together.
+    bands = rng.permuted(numpy.tile(numpy.arange(unit), (count, 1)), axis=1)
+    within = rng.permuted(numpy.tile(numpy.arange(unit), (count, unit, 1)), axis=2)
+    return (bands[:, :, numpy.newaxis] * unit + within).reshape(count, unit * unit)
+
+
+def generate_boards(n, unit=3, seed=None, base=16, chunk=1 << 16, variety=1024):
+    """Return an (n, size, size) numpy array of random full grids.
+
+    ``base`` grids come from generate_board() and every output grid is one
+    of them under a random symmetry, as _shuffle() applies.  For each
+    ``chunk`` of grids, ``variety`` relabeled/transposed copies of the base
+    grids and ``variety`` row and column orders are drawn, and each grid
+    combines one of each with a single gather.
+
+    Without numpy the grids are shuffled one by one with the random module
+    and returned as nested lists.
+    """
+    rng = seed if isinstance(seed, random.Random) else random.Random(seed)
+    size = unit ** 2
+    try:
+        import numpy
+    except ImportError:
+        g = geometry(unit)
+        grids = [generate_board(unit, seed=rng).cells for _ in range(base)]
+        boards = []
+        for _ in range(n):
+            cells = _shuffle(rng.choice(grids), g, rng)
+            boards.append([cells[row * size:(row + 1) * size] for row in range(size)])
+        return boards
+    dtype = numpy.uint8 if size < 256 else numpy.uint16
+    grids = numpy.array([generate_board(unit, seed=rng).cells for _ in range(base)], dtype=dtype
+                        ).reshape(base, size, size)
+    np_rng = numpy.random.default_rng(rng.getrandbits(64))
+    result = numpy.empty((n, size, size), dtype=dtype)
+    for start in range(0, n, chunk):
+        count = min(chunk, n - start)
+        labels = numpy.zeros((variety, size + 1), dtype=dtype)
+        labels[:, 1:] = np_rng.permuted(numpy.tile(numpy.arange(1, size + 1, dtype=dtype), (variety, 1)), axis=1)
+        tables = labels[numpy.arange(variety)[:, None, None], grids[np_rng.integers(base, size=variety)]]
+        flip = np_rng.random(variety) < 0.5
+        tables[flip] = tables[flip].transpose(0, 2, 1)
+        rows = _random_lines(numpy, np_rng, variety, unit).astype(numpy.int32) * size
+        cols = _random_lines(numpy, np_rng, variety, unit).astype(numpy.int32)
+
+        table = np_rng.integers(variety, size=count, dtype=numpy.int32) * (size * size)
+        left = rows[np_rng.integers(variety, size=count)] + table[:, None]
+        index = left[:, :, None] + cols[np_rng.integers(variety, size=count)][:, None, :]
+        tables.reshape(-1).take(index, out=result[start:start + count])
+    return result
+
+
 if __name__ == "__main__":
     board = generate_board(3, 10000)
     if board:
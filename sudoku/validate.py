@@ -0,0 +1,85 @@
+"""Vectorized validation of many boards at once.
+
+Boards are an (N, n, n) integer array with n = unit ** 2 and 0 for empty
+cells.  A cell is in conflict when its value repeats in its row, column or
+block, exactly as Board.check() reports it.
+"""
+import numpy
+from sudoku import Board
+
+
+CHUNK = 1 << 16
+
+
+def to_array(boards):
+    """Stack Boards (or anything array-like) into an (N, n, n) array."""
+    if isinstance(boards, Board):
+        boards = [boards]
+    if isinstance(boards, (list, tuple)) and boards and isinstance(boards[0], Board):
+        size = boards[0].rows
+        return numpy.array([board.cells for board in boards], dtype=numpy.uint8 if size < 256 else numpy.uint16
+                           ).reshape(len(boards), size, size)
+    array = numpy.asarray(boards)
+    return array[numpy.newaxis] if array.ndim == 2 else array
+
+
+def _block_view(boards, unit):
+    # Rearrange (N, n, n) so that axis 1 indexes blocks and axis 2 the cells
+    # within each block; applying it twice restores the original layout.
+    count = boards.shape[0]
+    return boards.reshape(count, unit, unit, unit, unit).transpose(0, 1, 3, 2, 4).reshape(boards.shape)
+
+
+def _bit_dtype(size):
+    for dtype in (numpy.uint8, numpy.uint16, numpy.uint32, numpy.uint64):
+        if size <= 8 * numpy.dtype(dtype).itemsize:
+            return dtype
+    raise ValueError("boards wider than 64 cells are not supported")
+
+
+def _repeats(bits):
+    # For (N, n, n) one-hot value bits, flag every cell whose value occurs
+    # more than once along axis 2 by folding "seen once" / "seen twice"
+    # masks across the group.
+    once = numpy.zeros(bits.shape[:2], bits.dtype)
+    twice = numpy.zeros_like(once)
+    for member in range(bits.shape[2]):
+        value = bits[:, :, member]
+        twice |= once & value
+        once |= value
+    return (bits & twice[:, :, numpy.newaxis]) != 0
+
+
+def conflicts(boards):
+    """Return an (N, n, n) bool array of the cells in conflict."""
+    boards = to_array(boards)
+    if boards.ndim != 3 or boards.shape[1] != boards.shape[2]:
+        raise ValueError("boards must have shape (N, n, n), not {}".format(boards.shape))
+    size = boards.shape[1]
+    unit = round(size ** 0.5)
+    if unit * unit != size:
+        raise ValueError("{}x{} is not a sudoku board".format(size, size))
+    if boards.size and (boards.min() < 0 or boards.max() > size):
+        raise ValueError("board values must be in 0..{}".format(size))
+
+    dtype = _bit_dtype(size + 1)
+    one = dtype(1)
+    result = numpy.empty(boards.shape, dtype=bool)
+    for start in range(0, boards.shape[0], CHUNK):
+        # Value v becomes bit v - 1 and an empty cell becomes 0.
+        bits = (one << boards[start:start + CHUNK].astype(dtype)) >> one
+        mask = _repeats(bits)
+        mask |= _repeats(bits.transpose(0, 2, 1)).transpose(0, 2, 1)
+        mask |= _block_view(_repeats(_block_view(bits, unit)), unit)
+        result[start:start + CHUNK] = mask
+    return result
+
+
+def validate(boards):
+    """Return ``(valid, conflicts)`` for a batch of boards.
+
+    ``valid`` is an (N,) bool array that is True where a board has no
+    conflicts, and ``conflicts`` is the per-cell mask from conflicts().
+    """
+    mask = conflicts(boards)
+    return ~mask.any(axis=(1, 2)), mask